@@ -3,15 +3,23 @@
 
 import logging
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
+from pandas._libs.sparse import IntIndex
+import pyarrow as pa
+import pyarrow.compute as pc
 
 from pyalex import Works, Authors, Institutions, Concepts
 
 # config must NOT be imported from pyalex here as it is already imported via entities_analysis
 
 from openalex_analysis.data import *
+from openalex_analysis.data.entities_data import get_entity_metadata
+from openalex_analysis.data.entities_data import intern_openalex_ids, get_openalex_ids_from_interned
+from openalex_analysis.data.entities_data import read_yearly_usage_index, write_yearly_usage_index
 
 
 class EntitiesAnalysis(EntitiesData):
@@ -25,6 +33,9 @@ class EntitiesAnalysis(EntitiesData):
         self.count_element_type = None
         self.count_element_years = None
         self.count_entities_cols = []
+        # (element, year) -> count indexes of the elements used by entities_df, per element type, with the dataframe
+        # they were built from (see get_yearly_usage_index())
+        self.yearly_usage_indexes = {}
         # variables for the collaborations with institutions dataframe:
         self.collaborations_with_institutions_entities_from_metadata = pd.DataFrame() # ids and metadata of the entities
         # for which to look for their collaborations
@@ -73,12 +84,13 @@ class EntitiesAnalysis(EntitiesData):
         self.collaborations_with_institutions_year = year
 
         # get entities_from metadata
+        prefetch_entities_metadata(entities_from)
         self.collaborations_with_institutions_entities_from_metadata = [pd.DataFrame()] * len(entities_from)
         for i, entity_id in tqdm(enumerate(entities_from),
                                       total=len(self.collaborations_with_institutions_entities_from_metadata),
                                       desc="Getting entities_from metadata"):
             if get_entity_type_from_id(entity_id) == Institutions:
-                inst_obj = Institutions()[entity_id]
+                inst_obj = get_entity_metadata(entity_id)
                 self.collaborations_with_institutions_entities_from_metadata[i] = {'id': inst_obj['id'][21:],
                                                 'name': inst_obj['display_name'],
                                                 'lat': inst_obj['geo']['latitude'],
@@ -86,7 +98,7 @@ class EntitiesAnalysis(EntitiesData):
                                                 'country': inst_obj['geo']['country'],
                                                 }
             elif get_entity_type_from_id(entity_id) == Authors:
-                inst_obj = Authors()[entity_id]
+                inst_obj = get_entity_metadata(entity_id)
                 self.collaborations_with_institutions_entities_from_metadata[i] = {'id': inst_obj['id'][21:],
                                                 'name': inst_obj['display_name'],
                                                 }
@@ -95,6 +107,11 @@ class EntitiesAnalysis(EntitiesData):
         self.collaborations_with_institutions_entities_from_metadata = pd.DataFrame(
             self.collaborations_with_institutions_entities_from_metadata).set_index('id')
 
+        # download the works of all the entities_from at once, the works shared are downloaded only once
+        WorksAnalysis(create_dataframe=False).download_datasets_of_entities_from(
+            entities_from,
+            extra_filters=extra_filters_for_entities_from if extra_filters_for_entities_from != {} else None)
+
         self.collaborations_with_institutions_df = [pd.DataFrame()] * len(entities_from)
         for i, institution_from in enumerate(entities_from):
             log_oa.info(f"Processing {institution_from} "
@@ -117,28 +134,41 @@ class EntitiesAnalysis(EntitiesData):
                 works = WorksAnalysis(institution_from, extra_filters = extra_filters_for_entities_from)
             else:
                 works = WorksAnalysis(institution_from)
-            # get the list of institutions who collaborated per work:
-            collaborations_per_work = [
-                list(set([institution['id'] for author in work for institution in author['institutions']]))
-                for work in works.entities_df['authorships'].to_list()
-            ]
-            # list of the institutions we collaborated with
-            institutions_collaborations = set(list(
-                [institution for institutions in collaborations_per_work
-                 for institution in institutions if institution not in institutions_to_exclude_i]
-            ))
+            authorships_edges = works.get_edge_table('authorships', columns=['work_id', 'institution_id'], dropna=True)
+            if authorships_edges is not None:
+                # use the flat edge table: one row per work and institution we collaborated with
+                collaborations_edges = authorships_edges.drop_duplicates()
+                collaborations_edges = collaborations_edges[~collaborations_edges['institution_id'].isin(
+                    intern_openalex_ids(pa.array(institutions_to_exclude_i, pa.string())).to_pylist())]
+                # count on the interned ids and get the ids back only for the institutions found
+                institutions_count = collaborations_edges['institution_id'].value_counts()
+                institutions_count_dict = Counter(dict(zip(
+                    get_openalex_ids_from_interned(institutions_count.index, 'I').to_pylist(),
+                    institutions_count.to_list())))
+                institutions_collaborations = set(institutions_count_dict)
+            else:
+                # get the list of institutions who collaborated per work:
+                collaborations_per_work = [
+                    list(set([institution['id'] for author in work for institution in author['institutions']]))
+                    for work in works.entities_df['authorships'].to_list()
+                ]
+                # list of the institutions we collaborated with
+                institutions_collaborations = set(list(
+                    [institution for institutions in collaborations_per_work
+                     for institution in institutions if institution not in institutions_to_exclude_i]
+                ))
+                # count the number of collaboration per institutions:
+                # collaborations_per_work contains the institutions we collaborated per work, so we
+                # can count on how many works we collaborated with each institution
+                institutions_count_dict = Counter(list(
+                    [institution for institutions in collaborations_per_work for institution in institutions
+                     if institution not in institutions_to_exclude_i]
+                ))
             log_oa.info(f"{len(institutions_collaborations)} unique institutions with which "
                         f"{self.collaborations_with_institutions_entities_from_metadata.at[institution_from, 'name']} "
                         f"collaborated")
             # remove the https://openalex.org/ at the beginning
             institutions_collaborations = [institution_id[21:] for institution_id in institutions_collaborations]
-            # count the number of collaboration per institutions:
-            # collaborations_per_work contains the institutions we collaborated per work, so we
-            # can count on how many works we collaborated with each institution
-            institutions_count_dict = Counter(list(
-                [institution for institutions in collaborations_per_work for institution in institutions
-                 if institution not in institutions_to_exclude_i]
-            ))
 
             # create dictionaries with the institution id as key and lon, lat and name as item
             institutions_name = [None] * len(institutions_collaborations)
@@ -203,7 +233,42 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
     """
     This class contains specific methods for Works entity analysis.
     """
-    def get_element_count(self, element_type: str, count_years: list[int] | None = None) -> pd.Series:
+    # type tag of the ids of the elements counted by get_element_count() (see intern_openalex_ids())
+    element_type_tags = {'reference': 'W', 'concept': 'C'}
+    # list column of the dataset, edge table and edge table column of the elements counted by get_element_count()
+    element_type_columns = {'reference': ('referenced_works', 'references', 'referenced_work_id'),
+                            'concept': ('concepts', 'concepts', 'concept_id')}
+
+    def get_element_uses(self, element_type: str) -> tuple[pa.Array, pa.Array]:
+        """
+        Get the interned ids of the elements used by the works in self.entities_df (one per use) with the publication
+        year of the work using them, from the flat edge table if it was written with the dataset, otherwise by
+        flattening the list column of self.entities_df once.
+
+        :param element_type: The element type ('reference' or 'concept').
+        :type element_type: str
+        :return: The interned ids of the elements and the publication years.
+        :rtype: tuple[pa.Array, pa.Array]
+        """
+        list_column, edge_table_name, edge_column = self.element_type_columns[element_type]
+        edges = self.get_edge_table(edge_table_name)
+        if edges is not None:
+            return pa.array(edges[edge_column], pa.int64()), pa.array(edges['publication_year'], pa.int64())
+        if list_column == 'concepts':
+            lists = pa.array(self.entities_df[list_column], pa.list_(pa.struct([('id', pa.string())])))
+            elements = pc.struct_field(pc.list_flatten(lists), 'id')
+        else:
+            lists = pa.array(self.entities_df[list_column], pa.list_(pa.string()))
+            elements = pc.list_flatten(lists)
+        years = pa.array(self.entities_df['publication_year'], pa.int64()).take(pc.list_parent_indices(lists))
+        return intern_openalex_ids(elements), years
+
+
+    def get_element_count(self,
+                          element_type: str,
+                          count_years: list[int] | None = None,
+                          interned_ids: bool = False
+                          ) -> pd.Series:
         """
         Count the number of times each element (for now references or concepts) is used by the works in self.entities_df
         in total or by year (optional).
@@ -212,9 +277,68 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
         :type element_type: str
         :param count_years: List of years to count the concepts. The default value is None to not count by years.
         :type count_years: list[int]
+        :param interned_ids: Index the count by the interned ids of the elements (see intern_openalex_ids()) instead of
+            their ids, e.g. to send a compact count to another process. The default value is False.
+        :type interned_ids: bool
         :return: The element count.
         :rtype: pd.Series
         """
+        def get_elements_index(elements: pa.Array | pa.ChunkedArray, type_tag: str) -> pd.Index:
+            """
+            Get the index of the count from the interned ids of the elements.
+
+            :param elements: The interned ids of the elements.
+            :type elements: pa.Array | pa.ChunkedArray
+            :param type_tag: The type tag of the ids (e.g. "W" for works).
+            :type type_tag: str
+            :return: The interned ids if interned_ids is True, otherwise the ids.
+            :rtype: pd.Index
+            """
+            if interned_ids:
+                return pd.Index(elements.to_numpy())
+            return pd.Index(get_openalex_ids_from_interned(elements, type_tag).to_pandas())
+
+        def count_elements(elements: pa.Array, years: pa.Array, type_tag: str, index_name: str) -> pd.Series:
+            """
+            Count the elements in a single pass, in total or by year (with a group by on (element, year)). The order of
+            the count is the same as with value_counts() on the elements (of each year).
+
+            :param elements: The interned ids of the elements (see intern_openalex_ids()), one per use of an element.
+            :type elements: pa.Array
+            :param years: The publication year of the work using each element.
+            :type years: pa.Array
+            :param type_tag: The type tag of the ids (e.g. "W" for works).
+            :type type_tag: str
+            :param index_name: The name of the index of the count.
+            :type index_name: str
+            :return: The count (indexed by element, or by element and year if count_years is given).
+            :rtype: pd.Series
+            """
+            uses = pa.table({'element': elements, 'year': years.cast(pa.int64())})
+            uses = uses.filter(pc.is_valid(pc.field('element')))
+            if count_years is None:
+                # group_by() without threads keeps the order of first appearance, and the sort is stable
+                counts = uses.group_by('element', use_threads=False).aggregate([([], 'count_all')])
+                counts = counts.take(pc.sort_indices(counts, [('count_all', 'descending')]))
+                return pd.Series(counts['count_all'].to_numpy(), name='count', dtype='Int64',
+                                 index=get_elements_index(counts['element'], type_tag).rename(index_name))
+            years_list = pa.array(count_years, pa.int64())
+            uses = uses.filter(pc.is_in(pc.field('year'), value_set=years_list))
+            counts = uses.group_by(['element', 'year'], use_threads=False).aggregate([([], 'count_all')])
+            year_positions = pc.index_in(counts['year'], value_set=years_list)
+            counts = counts.append_column('year_position', year_positions)
+            # the elements are sorted by count in the first year they are used in
+            counts = counts.take(pc.sort_indices(counts, [('year_position', 'ascending'), ('count_all', 'descending')]))
+            elements_sorted = pc.unique(counts['element'])
+            # fill the (element, year) count matrix, with 0 for the years in which an element isn't used
+            count_matrix = np.zeros((len(elements_sorted), len(count_years)), dtype=np.int64)
+            count_matrix[pc.index_in(counts['element'], value_set=elements_sorted).to_numpy(),
+                         counts['year_position'].to_numpy()] = counts['count_all'].to_numpy()
+            index = pd.MultiIndex.from_product(
+                [get_elements_index(elements_sorted, type_tag), count_years],
+                names=[index_name, None])
+            return pd.Series(count_matrix.ravel(), index=index, name='count', dtype='Int64')
+
         def get_works_references_count() -> pd.Series:
             """
             Count the number of times each referenced work is used by the works in self.entities_df.
@@ -223,17 +347,8 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
             :rtype: pd.Series
             """
             log_oa.info(f"Creating the works references count of {self.get_entity_type_string_name()}...")
-            if count_years is None:
-                return self.entities_df['referenced_works'].explode().value_counts().convert_dtypes()
-            else:
-                counts_df_list = [None] * len(count_years)
-                for i, year in enumerate(count_years):
-                    counts_df_list[i] = self.entities_df[self.entities_df.publication_year == year][
-                        'referenced_works'].explode().value_counts().convert_dtypes()
-                entities_count = pd.concat(counts_df_list, axis=1, keys=count_years).reset_index().fillna(0)
-                entities_count = entities_count.set_index('referenced_works').stack()
-                entities_count.name = 'count'
-                return entities_count
+            elements, years = self.get_element_uses('reference')
+            return count_elements(elements, years, self.element_type_tags['reference'], 'referenced_works')
 
         def get_works_concepts_count() -> pd.Series:
             """
@@ -243,19 +358,8 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
             :rtype: pd.Series
             """
             log_oa.info(f"Creating the concept count of {self.get_entity_type_string_name()}...")
-            if count_years is None:
-                return self.entities_df['concepts'].explode().apply(
-                    lambda c: c['id'] if type(c) == dict else None).value_counts().convert_dtypes()
-            else:
-                counts_df_list = [None] * len(count_years)
-                for i, year in enumerate(count_years):
-                    counts_df_list[i] = self.entities_df[self.entities_df.publication_year == year][
-                        'concepts'].explode().apply(
-                        lambda c: c['id'] if type(c) == dict else None).value_counts().convert_dtypes()
-                entities_count = pd.concat(counts_df_list, axis=1, keys=count_years).reset_index().fillna(0)
-                entities_count = entities_count.set_index('concepts').stack()
-                entities_count.name = 'count'
-                return entities_count
+            elements, years = self.get_element_uses('concept')
+            return count_elements(elements, years, self.element_type_tags['concept'], 'concepts')
 
         match element_type:
             case 'reference':
@@ -306,48 +410,196 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
                 "create_element_used_count_array()"
             )
 
-        self.element_count_df = pd.DataFrame()
-        self.element_count_df.index.name = self.count_element_type + "s"
+        # count of each entity (column name, count or None if the entity has no works), assembled at the end
+        entities_counts = []
 
         self.create_element_count_array_progress_percentage = 0
         self.create_element_count_array_progress_text = "Creating the " + self.count_element_type + "s array..."
 
+        # get the names of all the entities (used in the columns names) in a few queries
+        entities_names_to_get = [entity['entity_from_id'] for entity in entities_from or []
+                                 if entity.get('entity_from_id') is not None]
+        if self.entity_from_id is not None:
+            entities_names_to_get.append(self.entity_from_id)
+        prefetch_entities_metadata(entities_names_to_get)
+
         # Create the count array for the first/main entity if previously added to object
         if self.entity_from_id is not None:
             col_name = self.entity_from_id + " " + self.get_name_of_entity()
             self.count_entities_cols.append(col_name)
             if len(self.entities_df.index) == 0:
-                self.element_count_df[col_name] = pd.Series().convert_dtypes()
+                entities_counts.append((col_name, None))
             else:
-                self.element_count_df = pd.concat(
-                    [self.element_count_df, self.get_element_count(self.count_element_type, count_years=count_years)],
-                    axis=1)
-                self.element_count_df = self.element_count_df.rename(columns={'count': col_name})
+                entities_counts.append((col_name, self.get_element_count(self.count_element_type,
+                                                                         count_years=count_years, interned_ids=True)))
 
         if count_years is not None:
-            for i, entity in enumerate(entities_from):
-                self.create_element_count_array_progress_percentage = int(i / len(entities_from) * 100)
-                # initialise the WorksAnalysis instance
-                works = WorksAnalysis(**entity, load_only_columns=cols_to_load)
-                col_name = works.entity_from_id + " " + works.get_name_of_entity()
+            # download the works of all the entities at once (per extra filters), the works shared are downloaded only
+            # once
+            entities_from_per_extra_filters = {}
+            for entity in entities_from:
+                if entity.get('entity_from_id') is not None and set(entity) <= {'entity_from_id', 'extra_filters'}:
+                    entities_from_per_extra_filters.setdefault(str(entity.get('extra_filters')), []).append(entity)
+            for entities in entities_from_per_extra_filters.values():
+                WorksAnalysis(create_dataframe=False).download_datasets_of_entities_from(
+                    [entity['entity_from_id'] for entity in entities], extra_filters=entities[0].get('extra_filters'),
+                    load_only_columns=cols_to_load)
+            n_parallel_counts = min(config.n_parallel_counts, len(entities_from))
+            # the steps are the counts of the entities, and the downloads of their datasets in parallel mode
+            n_steps = len(entities_from) * (2 if n_parallel_counts > 1 else 1)
+            n_steps_done = 0
+            if n_parallel_counts > 1:
+                def update_dataset(entity: dict):
+                    WorksAnalysis(**entity, create_dataframe=False,
+                                  load_only_columns=cols_to_load).update_entities_dataset()
+
+                # the datasets are downloaded in threads, then loaded and counted in processes
+                with ThreadPoolExecutor(max_workers=config.n_parallel_downloads) as executor:
+                    for _ in executor.map(update_dataset, entities_from):
+                        n_steps_done += 1
+                        self.create_element_count_array_progress_percentage = int(n_steps_done / n_steps * 100)
+                with ProcessPoolExecutor(max_workers=n_parallel_counts) as executor:
+                    futures = [executor.submit(WorksAnalysis.count_elements_of_entity, entity, self.count_element_type,
+                                               count_years, cols_to_load, dict(config)) for entity in entities_from]
+                    for _ in as_completed(futures):
+                        n_steps_done += 1
+                        self.create_element_count_array_progress_percentage = int(n_steps_done / n_steps * 100)
+                    entities_from_counts = [future.result() for future in futures]
+            else:
+                entities_from_counts = []
+                for entity in entities_from:
+                    entities_from_counts.append(WorksAnalysis.count_elements_of_entity(
+                        entity, self.count_element_type, count_years, cols_to_load))
+                    n_steps_done += 1
+                    self.create_element_count_array_progress_percentage = int(n_steps_done / n_steps * 100)
+            for col_name, count in entities_from_counts:
                 self.count_entities_cols.append(col_name)
-                # if there is no data in the dataframe, we add a blank column
-                if len(works.entities_df.index) == 0:
-                    self.element_count_df[col_name] = pd.Series().convert_dtypes()
-                else:
-                    self.element_count_df = pd.concat(
-                        [self.element_count_df,
-                         works.get_element_count(self.count_element_type, count_years=count_years)],
-                        axis=1)
-                    self.element_count_df = self.element_count_df.rename(columns={'count': col_name})
-            self.element_count_df.index = self.element_count_df.index.set_names('element', level=0)
-            self.element_count_df.index = self.element_count_df.index.set_names('year', level=1)
-        else:
-            self.element_count_df.index.name = 'element'
+                entities_counts.append((col_name, count))
+        self.element_count_df = self.get_sparse_count_array(entities_counts, count_years,
+                                                            self.element_type_tags[self.count_element_type])
 
         self.create_element_count_array_progress_percentage = 100
 
 
+    @staticmethod
+    def count_elements_of_entity(entity: dict,
+                                 element_type: str,
+                                 count_years: list[int],
+                                 cols_to_load: list[str],
+                                 config_values: dict | None = None
+                                 ) -> tuple[str, pd.Series | None]:
+        """
+        Loads the works of an entity (only the years counted) and counts the elements they use (see
+        get_element_count()). It runs in the process pool of create_element_used_count_array() when
+        config.n_parallel_counts is greater than 1, so the count is indexed by the interned ids to be sent back
+        compactly.
+
+        :param entity: The parameters of the WorksAnalysis instance of the entity (e.g. {'entity_from_id': 'I1'}).
+        :type entity: dict
+        :param element_type: The element type ('reference' or 'concept').
+        :type element_type: str
+        :param count_years: The years to count.
+        :type count_years: list[int]
+        :param cols_to_load: The columns of the dataset to load.
+        :type cols_to_load: list[str]
+        :param config_values: The configuration of the main process, to use in a process which isn't forked from it.
+            The default value is None to keep the current configuration.
+        :type config_values: dict | None
+        :return: The column name of the entity and the count, or None if the entity has no works.
+        :rtype: tuple[str, pd.Series | None]
+        """
+        if config_values is not None:
+            for key, value in config_values.items():
+                setattr(config, key, value)
+        # only the works of the years counted are loaded (only these partitions are read from a partitioned dataset)
+        works = WorksAnalysis(**entity, load_only_columns=cols_to_load,
+                              load_filters=[('publication_year', 'in', count_years)])
+        col_name = works.entity_from_id + " " + works.get_name_of_entity()
+        # if there is no data in the dataframe, the entity has a blank column
+        if len(works.entities_df.index) == 0:
+            return col_name, None
+        return col_name, works.get_element_count(element_type, count_years=count_years, interned_ids=True)
+
+
+    def get_sparse_count_array(self,
+                               entities_counts: list[tuple[str, pd.Series | None]],
+                               count_years: list[int] | None = None,
+                               type_tag: str | None = None
+                               ) -> pd.DataFrame:
+        """
+        Assembles the counts of the entities in one element count array, in one shot. The rows are the union of the
+        elements counted (in their order of first appearance) and each count is stored in a sparse column (0 for the
+        elements not used by the entity), so the array stays small with many entities and millions of elements. Use
+        get_dense_element_count_array() to get dense counts for the rows displayed.
+
+        :param entities_counts: The column name and the count (see get_element_count()) of each entity, or None if the
+            entity has no works.
+        :type entities_counts: list[tuple[str, pd.Series | None]]
+        :param count_years: The years counted, or None if the counts aren't by year.
+        :type count_years: list[int] | None
+        :param type_tag: If the counts are indexed by interned ids (see get_element_count()), the type tag of the
+            elements to get their ids back (e.g. "W" for references). The default value is None.
+        :type type_tag: str | None
+        :return: The element count array, indexed by element (and year).
+        :rtype: pd.DataFrame
+        """
+        counts = [count for col_name, count in entities_counts if count is not None]
+        elements = pd.Index(np.concatenate(
+            [count.index.get_level_values(0).unique().to_numpy() for count in counts] or [[]])).unique()
+        elements_ids = elements
+        if type_tag is not None:
+            elements_ids = pd.Index(get_openalex_ids_from_interned(elements, type_tag).to_pandas())
+        if count_years is None:
+            index = elements_ids.rename('element')
+        else:
+            index = pd.MultiIndex.from_product([elements_ids, count_years], names=['element', 'year'])
+        columns = {}
+        for i, (col_name, count) in enumerate(entities_counts):
+            # each sparse column is built from the rows and values of the count, without a dense buffer
+            rows = np.array([], dtype=np.int32)
+            values = np.array([], dtype=np.int64)
+            if count is not None:
+                if count_years is None:
+                    rows = elements.get_indexer(count.index)
+                else:
+                    rows = (elements.get_indexer(count.index.get_level_values(0)) * len(count_years)
+                            + pd.Index(count_years).get_indexer(count.index.get_level_values(1)))
+                values = count.to_numpy(dtype=np.int64, na_value=0)
+                rows_order = np.argsort(rows, kind='stable')
+                rows = rows[rows_order].astype(np.int32)
+                values = values[rows_order]
+            columns[i] = pd.arrays.SparseArray(values, sparse_index=IntIndex(len(index), rows), fill_value=0,
+                                               dtype=pd.SparseDtype(np.int64, 0))
+        element_count_df = pd.DataFrame(columns, index=index)
+        element_count_df.columns = [col_name for col_name, count in entities_counts]
+        return element_count_df
+
+
+    def get_dense_element_count_array(self,
+                                      n_elements: int | None = 100,
+                                      elements: list[str] | None = None
+                                      ) -> pd.DataFrame:
+        """
+        Gets rows of the element count array (element_count_df) with dense columns, e.g. the top elements to display
+        once the array is sorted, without converting the whole sparse array.
+
+        :param n_elements: The number of elements to get, from the top of the array. The default value is 100. None to
+            get all the elements.
+        :type n_elements: int | None
+        :param elements: The elements to get. The default value is None to get the first n_elements elements.
+        :type elements: list[str] | None
+        :return: The rows of the element count array, with dense columns.
+        :rtype: pd.DataFrame
+        """
+        df = self.element_count_df
+        if elements is None:
+            elements = df.index.get_level_values(0).unique()
+            if n_elements is not None:
+                elements = elements[:n_elements]
+        df = df.loc[df.index.get_level_values(0).isin(elements)]
+        return df.astype({col: dtype.subtype for col, dtype in df.dtypes.items() if isinstance(dtype, pd.SparseDtype)})
+
+
     def sort_count_array(self,
                          sort_by: str = 'h_used_all_l_use_main',
                          sort_by_ascending: bool = False
@@ -396,10 +648,12 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
         main_entity_col_id = self.element_count_df.columns.values[0]
         log_oa.info(f"Main entity: {main_entity_col_id}")
         nb_entities = len(self.element_count_df.columns)
-        self.element_count_df.fillna(value=0, inplace=True)
         log_oa.info("Computing sum_all_entities...")
-        # self.element_count_df['sum_all_entities'] = self.element_count_df.iloc[:, 1:1+nb_entities].sum(axis=1)
-        self.element_count_df['sum_all_entities'] = self.element_count_df.sum(axis=1)
+        # the sum is done one (sparse) column at a time to not convert the whole array to dense
+        sum_all_entities = np.zeros(len(self.element_count_df.index), dtype=np.int64)
+        for col in self.element_count_df.columns:
+            sum_all_entities += self.element_count_df[col].to_numpy(dtype=np.int64, na_value=0)
+        self.element_count_df['sum_all_entities'] = pd.array(sum_all_entities, dtype='Int64')
         log_oa.info("Computing average_all_entities...")
         self.element_count_df['average_all_entities'] = self.element_count_df['sum_all_entities'] / nb_entities
         log_oa.info("Computing proportion_used_by_main_entity")
@@ -407,8 +661,9 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
         log_oa.info("fill with NaN values 0 of sum_all_entities to avoid them to be used when ranking (we want to"
                     "ignore these rows as these references aren't used)")
         self.element_count_df['sum_all_entities'] = self.element_count_df['sum_all_entities'].replace(0, None)
-        self.element_count_df['proportion_used_by_main_entity'] = self.element_count_df[main_entity_col_id] / \
-                                                                  self.element_count_df['sum_all_entities']
+        self.element_count_df['proportion_used_by_main_entity'] = pd.array(
+            self.element_count_df[main_entity_col_id].to_numpy(dtype=np.int64, na_value=0), dtype='Int64') / \
+            self.element_count_df['sum_all_entities']
         # # we put -1 inplace of NaN values (it's where the sum_all_entities is 0 so the division failed)
         # self.element_count_df.fillna(value=-1, inplace=True)
         log_oa.info("Computing sum_all_entities rank...")
@@ -441,20 +696,35 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
         """
         if cols is None:
             cols = ['author.id', 'count', 'raw_affiliation_string', 'author.display_name', 'author.orcid']
-        df_authors = pd.json_normalize(self.entities_df['authorships'].explode().to_list())
-        authors_count = pd.DataFrame(df_authors.value_counts('author.id'))
-
-        df_authors = df_authors.drop_duplicates('author.id')
-        df_authors = df_authors.set_index('author.id')
-
-        authors_count = pd.merge(authors_count, df_authors, how='left', left_index=True, right_index=True).reset_index()
-
-        return authors_count[cols]
+        authorships = pa.Table.from_pandas(self.entities_df[['authorships']], preserve_index=False)['authorships']
+        authorships = authorships.combine_chunks()
+        if not pa.types.is_list(authorships.type) or not pa.types.is_struct(authorships.type.value_type):
+            return pd.DataFrame(columns=cols)
+        # one row per authorship, with the nested fields flattened in columns named like pd.json_normalize() (e.g.
+        # author.id)
+        df_authors = pa.Table.from_struct_array(pc.list_flatten(authorships))
+        while any(pa.types.is_struct(field.type) for field in df_authors.schema):
+            df_authors = df_authors.flatten()
+        missing_cols = [col for col in cols if col != 'count' and col not in df_authors.column_names]
+        if missing_cols:
+            raise KeyError(f"{missing_cols} not in the columns of the authorships")
+        df_authors = df_authors.append_column('authorship_index', pa.array(np.arange(df_authors.num_rows)))
+        df_authors = df_authors.filter(pc.is_valid(pc.field('author.id')))
+        # count the authorships of each author and get the index of the first one (for the metadata of the author)
+        authors_count = df_authors.select(['author.id', 'authorship_index']).group_by(
+            'author.id', use_threads=False).aggregate([([], 'count_all'), ('authorship_index', 'min')])
+        authors_count = authors_count.take(pc.sort_indices(authors_count, [('count_all', 'descending')]))
+        first_authorships = df_authors.take(pc.index_in(authors_count['authorship_index_min'],
+                                                        value_set=df_authors['authorship_index']))
+        authors_count = first_authorships.append_column('count', authors_count['count_all'])
+
+        return authors_count.select(cols).to_pandas()
 
 
     def count_yearly_entity_usage(self, entity: str, count_years: list[int]) -> list[int]:
         """
-        Counts the yearly number of time the entity is used in entities_df.
+        Counts the yearly number of time the entity is used in entities_df. In aggregation mode, the works using the
+        entity are counted per year with a group_by query to the API instead.
 
         :param entity: The entity (id) to count.
         :type entity: str
@@ -463,48 +733,97 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
         :return: The number of time the entity is used on a yearly basis.
         :rtype: list[int]
         """
-        entity_link = "https://openalex.org/" + entity
-        count_res = [0] * len(count_years)
-        for i, year in enumerate(count_years):
-            # get the list of works from the year
-            df = self.entities_df.loc[self.entities_df['publication_year'] == year]
+        if self.aggregation_mode:
+            # count the works using the entity per year with a group_by query
             if self.get_entity_type_from_id(entity) == Concepts:
-                # get a dataframe with all the concepts used during the year in the column id
-                df = pd.json_normalize(df['concepts'].explode().to_list())
+                query_filters = {'concepts': {'id': entity}}
             elif self.get_entity_type_from_id(entity) == Works:
-                # get a dataframe with all the works used during the year in the column id
-                df = pd.DataFrame({'id': df['referenced_works'].explode().dropna()})
+                query_filters = {'cites': entity}
             else:
                 raise ValueError("Entity type not supported")
-            if df.empty:
-                count_res[i] = 0
+            count = self.get_group_by_count('publication_year', query_filters)
+            return [count.get(str(year), 0) for year in count_years]
+        return self.get_yearly_usage_counts([entity], count_years)[0].tolist()
+
+
+    def get_yearly_usage_index(self, element_type: str) -> pd.Series:
+        """
+        Gets the index of the number of times each element is used per year by the works in entities_df. It is built
+        once per dataset in a single pass (see get_element_uses()), kept in memory, and persisted next to the cached
+        dataset if entities_df contains all its entities (not if it was loaded with load_filters or replaced).
+
+        :param element_type: The element type ('reference' or 'concept').
+        :type element_type: str
+        :return: The number of uses, indexed by the interned id of the element and the year.
+        :rtype: pd.Series
+        """
+        cached = self.yearly_usage_indexes.get(element_type)
+        if cached is not None and cached[0] is self.entities_df:
+            return cached[1]
+        # the index persisted is the one of the whole dataset, it can't be used if entities_df was loaded with filters
+        # or replaced (e.g. by a subset of the entities)
+        whole_dataset_loaded = (self.whole_dataset_entities_df is not None
+                                and self.whole_dataset_entities_df is self.entities_df)
+        index_table = read_yearly_usage_index(self.database_file_path, element_type) if whole_dataset_loaded else None
+        if index_table is None:
+            log_oa.info(f"Creating the yearly usage index of the {element_type}s...")
+            elements, years = self.get_element_uses(element_type)
+            uses = pa.table({'element': elements, 'year': years.cast(pa.int64())})
+            index_table = uses.filter(pc.is_valid(pc.field('element'))).group_by(['element', 'year']).aggregate(
+                [([], 'count_all')]).rename_columns(['element', 'year', 'count'])
+            index_table = index_table.sort_by([('element', 'ascending'), ('year', 'ascending')])
+            if whole_dataset_loaded:
+                write_yearly_usage_index(self.database_file_path, element_type, index_table)
+        yearly_usage_index = pd.Series(index_table['count'].to_numpy(), name='count', index=pd.MultiIndex.from_arrays(
+            [index_table['element'].to_numpy(), index_table['year'].to_numpy()], names=['element', 'year']))
+        self.yearly_usage_indexes[element_type] = (self.entities_df, yearly_usage_index)
+        return yearly_usage_index
+
+
+    def get_yearly_usage_counts(self, entities: list[str], count_years: list[int]) -> np.ndarray:
+        """
+        Counts the yearly number of time each entity is used in entities_df, with lookups in the yearly usage indexes
+        (see get_yearly_usage_index()).
+
+        :param entities: The entities (ids) to count, concepts or works (references).
+        :type entities: list[str]
+        :param count_years: The years for which we need to count the entities.
+        :type count_years: list[int]
+        :return: The number of time each entity is used per year (one row per entity, one column per year).
+        :rtype: np.ndarray
+        """
+        counts = np.zeros((len(entities), len(count_years)), dtype=np.int64)
+        positions_per_element_type = {}
+        for i, entity in enumerate(entities):
+            if self.get_entity_type_from_id(entity) == Concepts:
+                positions_per_element_type.setdefault('concept', []).append(i)
+            elif self.get_entity_type_from_id(entity) == Works:
+                positions_per_element_type.setdefault('reference', []).append(i)
             else:
-                # count the concept usage
-                count = pd.DataFrame(df.value_counts('id'))
-                count_res[i] = count['count'].get(entity_link, 0)
-                # count_res[i] = count.loc[concept]['count']
-        return count_res
+                raise ValueError("Entity type not supported")
+        for element_type, positions in positions_per_element_type.items():
+            elements = intern_openalex_ids(pa.array([entities[i] for i in positions], pa.string())).to_numpy()
+            counts[positions] = self.get_yearly_usage_index(element_type).reindex(
+                pd.MultiIndex.from_product([elements, count_years]), fill_value=0).to_numpy().reshape(
+                len(positions), len(count_years))
+        return counts
 
 
     def count_yearly_works(self, count_years: list[int]) -> list[int]:
         """
-        Return the number of works present per year in entities_df.
+        Return the number of works present per year in entities_df. In aggregation mode, the works are counted per year
+        with a group_by query to the API instead.
 
         :param count_years: The years for which we need to count the works
         :type count_years: list[int]
         :return: Number of works per year.
         :rtype: list[int]
         """
-        count_res = [0] * len(count_years)
-        for i, year in enumerate(count_years):
-            # get the list of works from the year
-            df = self.entities_df.loc[self.entities_df['publication_year'] == year]
-            if df.empty:
-                count_res[i] = 0
-            else:
-                # get the number of rows
-                count_res[i] = len(df.index)
-        return count_res
+        if self.aggregation_mode:
+            count = self.get_group_by_count('publication_year')
+            return [count.get(str(year), 0) for year in count_years]
+        works_count = self.entities_df['publication_year'].value_counts()
+        return [int(works_count.get(year, 0)) for year in count_years]
 
 
     def get_df_yearly_usage_of_entities(self,
@@ -529,29 +848,23 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
             entity_used_ids = [entity_used_ids]
         if entity_from_legend == "Custom dataset" and self.entity_from_id is not None:
             entity_from_legend = self.entity_from_id
-        df = pd.DataFrame()
-        for entity_used_id in entity_used_ids:
-            # count
-            usage_count = self.count_yearly_entity_usage(entity_used_id, count_years)
-            works_count = self.count_yearly_works(count_years)
-            entity_used_id_list = [entity_used_id] * len(count_years)
-            entity_from_list = [entity_from_legend] * len(count_years)
-
-            # create the dataframe
-            zipped_data = list(zip(count_years,
-                                   usage_count,
-                                   works_count,
-                                   entity_used_id_list,
-                                   entity_from_list))
-
-            df_i = pd.DataFrame(zipped_data, columns=['years',
-                                                      'usage_count',
-                                                      'works_count',
-                                                      'entity_used',
-                                                      'entity_from',
-                                                      ])
-
-            df = pd.concat([df, df_i])
+        if not entity_used_ids:
+            return pd.DataFrame()
+        # count
+        if self.aggregation_mode:
+            usage_count = np.array([self.count_yearly_entity_usage(entity_used_id, count_years)
+                                    for entity_used_id in entity_used_ids], dtype=np.int64)
+        else:
+            usage_count = self.get_yearly_usage_counts(entity_used_ids, count_years)
+        works_count = self.count_yearly_works(count_years)
+
+        # create the dataframe, with count_years rows for each entity
+        df = pd.DataFrame({'years': np.tile(np.array(count_years, dtype=np.int64), len(entity_used_ids)),
+                           'usage_count': usage_count.ravel(),
+                           'works_count': np.tile(np.array(works_count, dtype=np.int64), len(entity_used_ids)),
+                           'entity_used': np.repeat(np.array(entity_used_ids, dtype=object), len(count_years)),
+                           'entity_from': entity_from_legend,
+                           }, index=np.tile(np.arange(len(count_years)), len(entity_used_ids)))
 
         return df
 
@@ -562,7 +875,9 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
                                                               entity_from_ids: str | list[str] | None = None,
                                                               ) -> pd.DataFrame:
         """
-        Gets the dataframe with the yearly usage by works of entity_used_ids, works for multiple entities from.
+        Gets the dataframe with the yearly usage by works of entity_used_ids, works for multiple entities from. If the
+        instance is in aggregation mode, the counts are made with group_by queries to the API, without downloading the
+        works.
 
         :param count_years: The years for which we need to count the entities.
         :type count_years: list[int]
@@ -586,8 +901,12 @@ class WorksAnalysis(EntitiesAnalysis, WorksData):
 
         df = pd.DataFrame()
 
+        if not self.aggregation_mode:
+            # download the works of all the entities at once, the works shared are downloaded only once
+            WorksAnalysis(create_dataframe=False).download_datasets_of_entities_from(entity_from_ids)
         for entity_from_id in entity_from_ids:
-            work_analysis = WorksAnalysis(entity_from_id)
+            # in aggregation mode, the counts are made with group_by queries and nothing is downloaded
+            work_analysis = WorksAnalysis(entity_from_id, aggregation_mode=self.aggregation_mode)
             df = pd.concat([
                 df,
                 work_analysis.get_df_yearly_usage_of_entities(count_years=count_years,
@@ -15,6 +15,8 @@ from openalex_analysis.data.entities_data import get_entity_type_from_id
 from openalex_analysis.data.entities_data import get_name_of_entity
 from openalex_analysis.data.entities_data import get_info_about_entity
 from openalex_analysis.data.entities_data import check_if_entity_exists
+from openalex_analysis.data.entities_data import check_if_entities_exist
+from openalex_analysis.data.entities_data import prefetch_entities_metadata
 
 
 __all__ = [
@@ -33,4 +35,6 @@ __all__ = [
     "get_name_of_entity",
     "get_info_about_entity",
     "check_if_entity_exists",
+    "check_if_entities_exist",
+    "prefetch_entities_metadata",
 ]
@@ -2,21 +2,36 @@
 # Licence GPLv3
 
 import os
+import shutil
 from os.path import exists, join, isdir, isfile, expanduser
 import psutil
 from pathlib import Path
 import hashlib  # to generate file names
-from time import time
+from time import time, monotonic, sleep
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 import logging
 import warnings
 import tomllib
+import json
+import sqlite3
+from collections import OrderedDict
+from itertools import chain
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote_plus
 
 import pyalex.api
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import requests
 
-from pyalex import Works, Authors, Sources, Institutions, Topics, Concepts, Publishers, config
+from pyalex import Works, Authors, Sources, Institutions, Topics, Concepts, Publishers, Work, config
 
 logging.captureWarnings(True)
 # define a custom logging
@@ -45,20 +60,65 @@ class AnalysisConfig(dict):
       "https://api.openalex.org".
     * **http_retry_times** (*int*) - maximum number of retries when querying the OpenAlex API in HTTP. The default value
       is 3.
+    * **max_requests_per_second** (*float*) - Maximum number of requests per second sent to the OpenAlex API, shared by
+      all the requests and download threads. When the API answers 429 (too many requests), all the requests are paused
+      for the Retry-After delay and the rate is halved, then it increases back progressively. If set to None, the rate
+      isn't limited (the 429 responses still pause the requests). The default value is 10.
     * **disable_tqdm_loading_bar** (*bool*) - To disable the tqdm loading bar. The default is False.
     * **n_max_entities** (*int*) - Maximum number of entities to download (the default value is to download maximum
-      10 000 entities). If set to None, no limitation will be applied.
+      10 000 entities). If set to None, no limitation will be applied. If a dataset of the same query was already
+      downloaded with a larger (or no) limit and contains the entities needed, it is loaded from the cache instead of
+      being downloaded again.
+    * **n_parallel_downloads** (*int*) - Number of threads used to download a dataset. When greater than 1 and all
+      the entities matching the query are downloaded, the query is split into disjoint shards (e.g. by publication
+      year for works) which are downloaded in parallel. It is also the number of threads used to query lists of
+      entities by id. The default value is 1 (sequential download).
+    * **n_parallel_counts** (*int*) - Number of processes used to count the elements used by each entity in
+      create_element_used_count_array(). When greater than 1, the datasets of the entities are first downloaded with
+      n_parallel_downloads threads, then each entity is loaded and counted in a process pool (on the platforms which
+      don't fork, the main script must be protected by if __name__ == "__main__"). The default value is 1 (sequential
+      count).
+    * **streaming_download** (*bool*) - Write the entities in parquet segments while they are downloaded instead of
+      keeping them all in memory. The segments are merged in the cached parquet file at the end of the download. The
+      download is checkpointed after each segment, so an interrupted download is resumed from the last checkpoint
+      the next time the dataset is loaded. The default value is False.
+    * **streaming_buffer_size** (*int*) - In streaming download, number of entities kept in memory (per download
+      thread) before being written in a parquet segment. The default value is 10000.
+    * **partition_datasets** (*bool*) - Store the cached datasets of works as hive-partitioned parquet datasets (a
+      folder with a sub folder per publication year) instead of a single parquet file. The row filters given when
+      loading a dataset (e.g. on the publication year) are then applied on the partitions, so only the partitions
+      needed are read. The default value is False.
+    * **download_only_loaded_columns** (*bool*) - When an entities dataset is loaded with load_only_columns, only these
+      columns (and the id) are downloaded, with the select parameter of the OpenAlex API. The columns held by each
+      cached dataset are stored in the dataset, and the columns missing when a dataset is loaded with other columns
+      are downloaded and added to it. If set to False, all the columns are downloaded. The default value is False.
+    * **download_abstracts** (*bool*) - Download and store the abstracts of the works. They are stored as compact
+      inverted indexes (abstract_inverted_index column) and only decoded, in batch, when the abstract column is
+      loaded. If set to False, the abstracts are never stored nor decoded (the abstract column is absent). The
+      default value is True.
+    * **write_edge_tables** (*bool*) - Write flat edge tables next to each cached dataset of works, in a folder with
+      the name of the dataset followed by .edges: work → reference (references.parquet), work → author → institution
+      (authorships.parquet) and work → concept with its score (concepts.parquet), with the OpenAlex ids interned in
+      int64. The analyses use them (when they are up to date) instead of exploding the nested columns of the dataset.
+      The default value is False.
     * **project_data_folder_path** (*str*) - Path to the folder containing the data downloaded from the OpenAlex API
       (these data are stored in compressed parquet files and used as a cache). The default path is
       "~/openalex-analysis/data".
     * **parquet_compression** (*str*) - Type of compression for the parquet files used as cache (see the Pandas
       documentation). The default value is "brotli".
+    * **cache_format** (*str*) - Format of the cached datasets. With 'parquet', the datasets are stored in compressed
+      parquet files. With 'arrow', they are stored in uncompressed Arrow IPC (Feather v2) files which are memory-mapped
+      when loaded: the DataFrames use ArrowDtype columns backed by the file pages, so loading a dataset doesn't need to
+      decode it, and the pages are shared between processes by the OS page cache. The Arrow files are larger and
+      partition_datasets doesn't apply to them. The default value is 'parquet'.
     * **max_storage_percent** (*int*) - When the disk capacity reaches this percentage, cached parquet files will be
       deleted. The default value is 95.
     * **max_storage_files** (*int*) - When the cache folder reaches this number of files, cached parquet files will be
-      deleted. The default value is 10000.
+      deleted. Only the cached datasets listed in the cache manifest are counted (a partitioned dataset and its edge
+      tables count as one file), not the other files of the folder. The default value is 10000.
     * **max_storage_size** (*int*) - When the cache folder reached this size (in bytes), cached parquet files will be
-      deleted. The default value is 5e9 (5 GB).
+      deleted. Only the size of the cached datasets listed in the cache manifest is counted. The default value is 5e9
+      (5 GB).
     * **min_storage_files** (*int*) - Before deleting files, we check if we exceed the minimum number of files and
       folder size. If one of those minimum if exceeded, we allow the program to delete cached parquet files. This is to
       avoid the setting max_storage_percent to delete every cached file when the disk is almost full. The default value
@@ -68,6 +128,15 @@ class AnalysisConfig(dict):
       the setting max_storage_percent to delete every cached file when the disk is almost full. The default value is 5e8
       (500 MB).
     * **cache_max_age** (*int*) - Maximum age of the cache in days. The default value is 365.
+    * **metadata_cache_size** (*int*) - Number of entities kept in memory by the entities metadata cache (used to get
+      the name or information of an entity). The entities metadata are also cached on disk in an SQLite database in
+      project_data_folder_path, and are downloaded again after cache_max_age days. The default value is 1000.
+    * **cache_refresh_mode** (*str*) - How to refresh a cached dataset older than cache_max_age. With 'full', the
+      dataset is deleted and downloaded again. With 'incremental', only the entities updated since the last download
+      are downloaded (with the OpenAlex filter from_updated_date, which may require an API key) and updated in the
+      cached dataset. The entities which no longer match the query (e.g. deleted or merged entities) stay in the
+      dataset until a full download. Datasets limited by n_max_entities are always fully downloaded again. The
+      default value is 'full'.
     * **log_level** (*str*) - The log detail level for openalex-analysis (library specific). The log_level must be
       'DEBUG', 'INFO', 'WARNING', 'ERROR' or 'CRITICAL'. The default value 'WARNING'.
     """
@@ -90,6 +159,17 @@ class AnalysisConfig(dict):
                     log_oa.setLevel(logging.CRITICAL)
                 case _:
                     raise ValueError("The log_level must be 'DEBUG', 'INFO', 'WARNING', 'ERROR' or 'CRITICAL'")
+        if key == "cache_refresh_mode" and value not in ['full', 'incremental']:
+            raise ValueError("The cache_refresh_mode must be 'full' or 'incremental'")
+        if key == "cache_format" and value not in ['parquet', 'arrow']:
+            raise ValueError("The cache_format must be 'parquet' or 'arrow'")
+        if key == "max_requests_per_second" and value is not None and value <= 0:
+            raise ValueError("The max_requests_per_second must be positive or None")
+        if key == "n_parallel_counts" and (not isinstance(value, int) or value < 1):
+            raise ValueError("The n_parallel_counts must be an integer greater than or equal to 1")
+        # the credentials are also used by pyalex to authenticate its queries
+        if key in ['email', 'api_key']:
+            setattr(pyalex.api.config, key, value)
 
         return super().__setitem__(key, value)
 
@@ -106,16 +186,28 @@ def set_default_config():
     config.api_key = None
     config.openalex_url = "https://api.openalex.org"
     config.http_retry_times = 3
+    config.max_requests_per_second = 10
     config.disable_tqdm_loading_bar = False
     config.n_max_entities = 10000
+    config.n_parallel_downloads = 1
+    config.n_parallel_counts = 1
+    config.streaming_download = False
+    config.streaming_buffer_size = 10000
+    config.partition_datasets = False
+    config.download_only_loaded_columns = False
+    config.download_abstracts = True
+    config.write_edge_tables = False
     config.project_data_folder_path = join(expanduser("~"), "openalex-analysis", "data")
     config.parquet_compression = "brotli"
+    config.cache_format = 'parquet'
     config.max_storage_percent = 95
     config.max_storage_files = 10000
     config.max_storage_size = 5e9
     config.min_storage_files = 1000
     config.min_storage_size = 5e8
     config.cache_max_age = 365
+    config.cache_refresh_mode = 'full'
+    config.metadata_cache_size = 1000
     config.log_level = 'WARNING'
 
 
@@ -157,10 +249,195 @@ else:
     set_default_config()
 
 
+class RateLimiter:
+    """
+    Thread-safe token bucket limiting the rate of the requests to the OpenAlex API, shared by all the requests. The
+    maximum rate is config.max_requests_per_second. When the API answers 429 (too many requests), the requests are
+    paused for the Retry-After delay and the rate is halved, then it increases back with the successful requests.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.max_rate = None
+        self.rate = None
+        self.tokens = 0.
+        self.last_refill_time = monotonic()
+        self.paused_until = 0.
+
+
+    def acquire(self):
+        """
+        Waits until a request can be sent.
+        """
+        while True:
+            with self.lock:
+                if config.max_requests_per_second != self.max_rate:
+                    self.max_rate = self.rate = config.max_requests_per_second
+                now = monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate is None:
+                    return
+                else:
+                    # the bucket holds at most one second of requests
+                    self.tokens = min(max(self.rate, 1.), self.tokens + (now - self.last_refill_time) * self.rate)
+                    self.last_refill_time = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+
+    def pause(self, delay: float):
+        """
+        Pauses all the requests and halves the rate, after a 429 response of the API.
+
+        :param delay: The delay of the pause in seconds.
+        :type delay: float
+        """
+        with self.lock:
+            # the requests sent before the pause can also get a 429, the rate is only halved once per pause
+            if self.rate is not None and monotonic() >= self.paused_until:
+                self.rate = max(self.rate / 2, min(self.max_rate, 1.))
+            self.paused_until = max(self.paused_until, monotonic() + delay)
+            self.tokens = 0.
+            self.last_refill_time = self.paused_until
+
+
+    def report_success(self):
+        """
+        Increases the rate back progressively after a successful request.
+        """
+        with self.lock:
+            if self.rate is not None and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+api_rate_limiter = RateLimiter()
+
+
+class RateLimitedSession(requests.Session):
+    """
+    HTTP session used for all the requests to the OpenAlex API (including the requests of pyalex), sent to
+    config.openalex_url. The connections are kept alive in a pool, each request waits for the rate limiter (see
+    RateLimiter) and the failed requests
+    (connection errors, 429 and 5xx responses) are retried config.http_retry_times times, after the Retry-After delay
+    of the response or an exponential backoff.
+    """
+    retry_status_codes = [429, 500, 502, 503, 504]
+
+    def request(self, method, url, *args, **kwargs):
+        # pyalex always queries https://api.openalex.org, the requests are sent to config.openalex_url instead
+        if isinstance(url, str) and url.startswith("https://api.openalex.org/"):
+            url = config.openalex_url.rstrip("/") + url.removeprefix("https://api.openalex.org")
+        for attempt in range(config.http_retry_times + 1):
+            api_rate_limiter.acquire()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == config.http_retry_times:
+                    raise
+                log_oa.info(f"Request to {url} failed ({e}), retrying...")
+                sleep(0.5 * 2 ** attempt)
+                continue
+            if response.status_code not in self.retry_status_codes or attempt == config.http_retry_times:
+                if response.ok:
+                    api_rate_limiter.report_success()
+                return response
+            delay = get_retry_after_delay(response)
+            if delay is None:
+                delay = 0.5 * 2 ** attempt
+            log_oa.info(f"Request to {url} failed (HTTP {response.status_code}), retrying in {delay:.1f}s...")
+            if response.status_code == 429:
+                # all the requests wait, not only this one
+                api_rate_limiter.pause(delay)
+            else:
+                sleep(delay)
+
+
+def get_retry_after_delay(response: requests.Response) -> float | None:
+    """
+    Gets the delay to wait before retrying a request from the Retry-After header of its response (in seconds or as
+    an HTTP date).
+
+    :param response: The response.
+    :type response: requests.Response
+    :return: The delay in seconds, or None if the response has no valid Retry-After header.
+    :rtype: float | None
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds(), 0.)
+    except (TypeError, ValueError):
+        return None
+
+
+# HTTP session shared by the threads querying the OpenAlex API
+http_session = None
+http_session_settings = None
+http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Gets the HTTP session shared by the threads querying the OpenAlex API (see RateLimitedSession). The session keeps
+    the connections alive in a pool (one connection per download thread).
+
+    :return: The HTTP session.
+    :rtype: requests.Session
+    """
+    global http_session, http_session_settings
+    with http_session_lock:
+        # create the session again if the settings changed
+        settings = config.n_parallel_downloads
+        if http_session is None or settings != http_session_settings:
+            # the retries are made by the session, with the rate limiter
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(10, config.n_parallel_downloads), max_retries=0)
+            http_session = RateLimitedSession()
+            http_session.mount("https://", adapter)
+            http_session.mount("http://", adapter)
+            http_session_settings = settings
+    return http_session
+
+
+# pyalex creates a new session for each query (pagers, entity lookups...), all its requests use the shared session
+# instead, so they are rate limited with the other requests. _get_requests_session is private to pyalex (checked with
+# pyalex 0.21), if it is missing the pyalex requests are only retried by pyalex itself
+if hasattr(pyalex.api, "_get_requests_session"):
+    pyalex.api._get_requests_session = get_http_session
+else:
+    log_oa.warning("pyalex.api._get_requests_session not found, the pyalex requests are not rate limited")
+
+
 class EntitiesData:
     """
     This class contains methods to download data from the OpenAlex API and manage + cache those datasets locally
     """
+    # key used to split the downloads in disjoint shards with a group_by query (None to disable the parallel download)
+    download_shard_key = None
+    # key used to partition the cached datasets if config.partition_datasets is enabled (None to never partition them)
+    dataset_partition_key = None
+    # columns of the datasets which don't have the name of the API field they are created from (column: API field)
+    columns_api_fields = {}
+    # columns of the datasets used to extract the edge tables (see extract_edge_tables())
+    edge_tables_columns = []
+    # explicit types of the known columns of the datasets (see convert_entities_list_to_table())
+    entities_schema = pa.schema([])
+    # number of entities converted at once to an Arrow table
+    conversion_batch_size = 10000
+    # columns decoded when the dataset is loaded from a column stored in the dataset (column: stored column)
+    lazy_columns = {}
+    # path of the field of the entities matched by the API filter on an entity from (filter: path), used to split the
+    # entities downloaded for several entities from at once (see download_datasets_of_entities_from())
+    entities_from_fields = {}
+    # maximum number of entities from in the OR filter of a bulk download (the API accepts up to 100 values)
+    bulk_download_batch_size = 50
 
     def __init__(self,
                  entity_from_id: str | None = None,
@@ -168,6 +445,8 @@ class EntitiesData:
                  database_file_path: dict | None = None,
                  create_dataframe: bool = True,
                  load_only_columns: list[str] | None = None,
+                 load_filters: list | None = None,
+                 aggregation_mode: bool = False,
                  ):
         """
 
@@ -185,8 +464,16 @@ class EntitiesData:
             entity_from_id or extra_filters is provided). The default value is True.
         :type create_dataframe: bool
         :param load_only_columns: Load only the specified columns from the parquet file. Everything will be downloaded
-            anyway. The default value is None.
+            anyway, unless config.download_only_loaded_columns is True. The default value is None.
         :type load_only_columns: str | None
+        :param load_filters: Load only the rows matching these filters from the parquet file (pyarrow filters format,
+            e.g. [('publication_year', '>=', 2020)]). Everything will be downloaded anyway. The default value is None.
+        :type load_filters: list | None
+        :param aggregation_mode: Answer the counts supporting it with group_by queries to the API (see
+            get_group_by_count()) instead of downloading the entities, the dataframe isn't created. The counts are made
+            on all the entities matching the query: unlike the downloaded datasets, they aren't limited by
+            config.n_max_entities. The default value is False.
+        :type aggregation_mode: bool
         """
         self.per_page = 200  # maximum allowed by the API
 
@@ -195,15 +482,22 @@ class EntitiesData:
         self.extra_filters = extra_filters
         self.database_file_path = database_file_path
         self.load_only_columns = load_only_columns
+        self.load_filters = load_filters
+        self.aggregation_mode = aggregation_mode
+        # number of rows to load from the database file if it's a cached dataset with more entities than needed
+        self.database_n_rows_limit = None
 
         # a dataframe containing entities related to the instance
         self.entities_df = None
+        # entities_df if it was loaded with all the entities of the dataset file (without filters or rows limit), so the
+        # indexes persisted next to the dataset can be used for it (see load_entities_dataframe())
+        self.whole_dataset_entities_df = None
 
         # # Dataframe with the entities filtered with multi concepts
         # self.entities_multi_filtered_df = None
 
         # Dataframe with all the element (count_element_type) of the entity(ies) and their count + the count for other
-        # entities (optional). The creation needs to be manually started.
+        # entities (optional), in sparse columns. The creation needs to be manually started.
         self.element_count_df = pd.DataFrame()
 
         # to display a loading bar on the web interface
@@ -215,7 +509,7 @@ class EntitiesData:
                 self.entity_from_type = self.get_entity_type_from_id(self.entity_from_id)
             if self.database_file_path is None:
                 self.database_file_path = join(config.project_data_folder_path, self.get_database_file_name())
-            if create_dataframe:
+            if create_dataframe and not self.aggregation_mode:
                 self.load_entities_dataframe()
 
     def get_count_entities_matched(self, query_filters: dict) -> int:
@@ -230,6 +524,30 @@ class EntitiesData:
         results, meta = self.EntityOpenAlex().filter(**query_filters).get(per_page=1, return_meta=True)
         return meta['count']
 
+    def get_group_by_count(self, group_by_key: str, query_filters: dict | None = None) -> dict[str, int]:
+        """
+        Counts the entities matching the query of the instance per value of group_by_key (e.g. publication_year) with a
+        group_by query to the API, without downloading the entities. The responses are cached (see
+        get_aggregate_from_cache()).
+
+        :param group_by_key: The key to group the entities by (e.g. "publication_year").
+        :type group_by_key: str
+        :param query_filters: Filters added to the query of the instance (e.g. {'concepts': {'id': 'C41008148'}}). The
+            default value is None.
+        :type query_filters: dict | None
+        :return: The number of entities per value of the key (as string).
+        :rtype: dict[str, int]
+        """
+        query = self.get_api_query() | (query_filters or {})
+        query_key = json.dumps({'entity_type': self.get_entity_type_string_name(), 'query': query,
+                                'group_by': group_by_key}, sort_keys=True, default=str)
+        groups_count = get_aggregate_from_cache(query_key)
+        if groups_count is None:
+            groups = self.EntityOpenAlex().filter(**query).group_by(group_by_key).get(per_page=200)
+            groups_count = {str(group['key']): group['count'] for group in groups}
+            add_aggregate_to_cache(query_key, groups_count)
+        return groups_count
+
     def get_api_query(self) -> dict:
         """
         Gets the api query from the parameters of the instance.
@@ -237,6 +555,20 @@ class EntitiesData:
         :return: The api query
         :rtype: dict
         """
+        query_filters = self.get_entity_from_filter()
+        if self.extra_filters is not None:
+            query_filters = query_filters | self.extra_filters
+        log_oa.info(f"query: {query_filters}")
+        return query_filters
+
+    def get_entity_from_filter(self) -> dict:
+        """
+        Gets the api query filter on the entity from of the instance (e.g. {'institutions': {'id': 'I138595864'}} for
+        the works of an institution).
+
+        :return: The filter, empty if the instance has no entity from.
+        :rtype: dict
+        """
         if self.entity_from_id is not None:
             query_filters = {self.get_entity_type_string_name(self.entity_from_type): {"id": self.entity_from_id}}
             # special cases:
@@ -252,9 +584,6 @@ class EntitiesData:
                 query_filters = {'affiliations': {'institution': {"id": self.entity_from_id}}}
         else:
             query_filters = {}
-        if self.extra_filters is not None:
-            query_filters = query_filters | self.extra_filters
-        log_oa.info(f"query: {query_filters}")
         return query_filters
 
 
@@ -267,10 +596,68 @@ class EntitiesData:
         :return: The entities in a DataFrame.
         :rtype: pd.DataFrame
         """
-        entities_list_df = pd.DataFrame.from_records(entities_list)
-        if self.EntityOpenAlex == Works:
-            entities_list_df = entities_list_df.rename(columns={'extracted_abstract': 'abstract'})
-        return entities_list_df
+        return self.decode_lazy_columns(self.convert_entities_list_to_table(entities_list)).to_pandas()
+
+
+    def convert_entities_list_to_table(self, entities_list: list) -> pa.Table:
+        """
+        Converts a list of entities (a list of PyAlex objects) downloaded from the OpenAlex API into an Arrow table,
+        built directly from batches of entities. The columns known in the schema of the entity type (entities_schema)
+        get their type from it, so the schemas of the datasets don't drift between downloads (e.g. a column or a nested
+        field without any value in a download). The fields added to the API (columns or nested fields missing in the
+        schema) are kept with an inferred type.
+
+        :param entities_list: The list of entities (PyAlex objects), None for an entity not found gives a null row.
+        :param entities_list: list
+        :return: The entities in an Arrow table.
+        :rtype: pa.Table
+        """
+        columns_renamed = {'extracted_abstract': 'abstract'} if self.EntityOpenAlex == Works else {}
+        tables = []
+        for i in range(0, len(entities_list), self.conversion_batch_size):
+            batch = [entity if entity is not None else {} for entity in entities_list[i:i + self.conversion_batch_size]]
+            # the columns are in the order of appearance of the keys, as with pd.DataFrame.from_records()
+            keys = dict.fromkeys(chain.from_iterable(batch))
+            tables.append(pa.table({
+                columns_renamed.get(key, key): self.convert_column_values_to_arrow_array(
+                    columns_renamed.get(key, key), [entity.get(key) for entity in batch])
+                for key in keys
+            }))
+        if not tables:
+            return pa.table({})
+        # the batches can have different columns or nested fields (e.g. a field only present in some entities)
+        return pa.concat_tables(tables, promote_options="permissive") if len(tables) > 1 else tables[0]
+
+
+    def convert_column_values_to_arrow_array(self, column: str, values: list) -> pa.Array:
+        """
+        Converts the values of a column of entities into an Arrow array, with the type of the column in entities_schema
+        (see convert_values_to_arrow_array()). The entity types having columns which need a specific conversion
+        override this method.
+
+        :param column: The name of the column.
+        :type column: str
+        :param values: The values of the column.
+        :type values: list
+        :return: The array.
+        :rtype: pa.Array
+        """
+        return convert_values_to_arrow_array(
+            values, self.entities_schema.field(column).type if column in self.entities_schema.names else None)
+
+
+    def decode_lazy_columns(self, entities_table: pa.Table) -> pa.Table:
+        """
+        Decodes the columns stored in another form in the datasets (see lazy_columns), e.g. the abstracts of the works
+        stored as inverted indexes.
+        This is a placeholder as not all entity types have lazy columns.
+
+        :param entities_table: The entities.
+        :type entities_table: pa.Table
+        :return: The entities with the lazy columns decoded.
+        :rtype: pa.Table
+        """
+        return entities_table
 
 
     def filter_and_format_entity_data_from_api_response(self, entity: dict):
@@ -281,9 +668,269 @@ class EntitiesData:
         pass
 
 
+    def extract_edge_tables(self, entities_table: pa.Table) -> dict[str, pa.Table]:
+        """
+        Extracts flat edge tables from the nested columns of a dataset (see config.write_edge_tables).
+        This is a placeholder as not all entity types have edge tables.
+
+        :param entities_table: The dataset.
+        :type entities_table: pa.Table
+        :return: The edge tables with their name as key.
+        :rtype: dict[str, pa.Table]
+        """
+        return {}
+
+
+    def write_edge_tables(self):
+        """
+        Writes the edge tables of the dataset of the instance (see extract_edge_tables()) in parquet files, in the
+        folder database_file_path + ".edges", if config.write_edge_tables is enabled.
+        """
+        if not config.write_edge_tables:
+            return
+        schema = get_dataset_schema(self.database_file_path)
+        edge_tables = self.extract_edge_tables(read_dataset_table(
+            self.database_file_path, columns=[column for column in self.edge_tables_columns if column in schema.names]))
+        if not edge_tables:
+            return
+        log_oa.info(f"Writing the edge tables {list(edge_tables)} of {self.database_file_path}...")
+        edges_folder_path = get_edge_tables_folder_path(self.database_file_path)
+        if isdir(edges_folder_path + ".tmp"):
+            shutil.rmtree(edges_folder_path + ".tmp")
+        os.makedirs(edges_folder_path + ".tmp")
+        for name, edge_table in edge_tables.items():
+            pq.write_table(edge_table, join(edges_folder_path + ".tmp", name + ".parquet"),
+                           compression=config.parquet_compression)
+        replace_dataset(edges_folder_path + ".tmp", edges_folder_path)
+
+
+    def get_edge_table(self, name: str, columns: list[str] | None = None, dropna: bool = False) -> pd.DataFrame | None:
+        """
+        Gets an edge table of the dataset of the instance (see config.write_edge_tables), restricted to the entities
+        of entities_df (e.g. if the dataset was loaded with filters).
+
+        :param name: The name of the edge table (e.g. "references").
+        :type name: str
+        :param columns: Only get these columns. The default value is None to get all the columns.
+        :type columns: list[str] | None
+        :param dropna: Drop the rows with a missing value (e.g. an author without institution), before the conversion
+            to a DataFrame so the interned ids keep the int64 dtype. The default value is False.
+        :type dropna: bool
+        :return: The edge table, with the ids interned (see intern_openalex_ids()), or None if it doesn't exist or isn't
+            up to date with the dataset.
+        :rtype: pd.DataFrame | None
+        """
+        if self.database_file_path is None or self.entities_df is None or 'id' not in self.entities_df.columns:
+            return None
+        edge_table = read_edge_table(self.database_file_path, name)
+        if edge_table is None:
+            return None
+        edge_table = edge_table.filter(pc.is_in(
+            edge_table['work_id'], value_set=intern_openalex_ids(pa.array(self.entities_df['id'], pa.string()))))
+        if columns is not None:
+            edge_table = edge_table.select(columns)
+        if dropna:
+            edge_table = edge_table.drop_null()
+        return edge_table.to_pandas()
+
+
+    def get_download_shards(self, query: dict, n_entities_to_download: int, count_entities_matched: int) -> list[dict]:
+        """
+        Splits the query into disjoint shards which can be downloaded in parallel. The shards are discovered with a
+        group_by count on download_shard_key (e.g. publication_year for works). The query is only split if all the
+        entities matched are downloaded, if config.n_parallel_downloads is greater than 1 and if the shards cover
+        exactly the entities matched. Otherwise, a list containing only the query is returned.
+
+        :param query: The query filters.
+        :type query: dict
+        :param n_entities_to_download: The number of entities to download.
+        :type n_entities_to_download: int
+        :param count_entities_matched: The number of entities matching the query.
+        :type count_entities_matched: int
+        :return: The list of query filters of each shard.
+        :rtype: list[dict]
+        """
+        if (self.download_shard_key is None or config.n_parallel_downloads <= 1
+                or n_entities_to_download < count_entities_matched or count_entities_matched <= self.per_page):
+            return [query]
+        groups = self.EntityOpenAlex().filter(**query).group_by(self.download_shard_key).get(per_page=200)
+        # the groups could miss some entities (e.g. null values or more than 200 groups), in this case we can't shard
+        if sum(group['count'] for group in groups) != count_entities_matched:
+            log_oa.info(f"Can't split the query by {self.download_shard_key}, downloading it sequentially")
+            return [query]
+        log_oa.info(f"Query split into {len(groups)} shards by {self.download_shard_key}")
+        # the groups are sorted by count, so the largest shards are downloaded first
+        return [query | {self.download_shard_key: group['key']} for group in groups]
+
+
+    def download_entities_of_query(self,
+                                   query: dict,
+                                   n_max: int | None,
+                                   update_progress=None,
+                                   segments_folder_path: str | None = None,
+                                   shard_index: int = 0,
+                                   cursor: str = "*",
+                                   segment_index: int = 0,
+                                   save_checkpoint=None,
+                                   columns: list[str] | None = None,
+                                   ) -> list:
+        """
+        Downloads the entities matching the query page by page and format them. If segments_folder_path is provided,
+        the entities are buffered and written in parquet segments in this folder each time the buffer reaches
+        config.streaming_buffer_size entities, so the memory used stays bounded. After each segment written,
+        save_checkpoint is called with the cursor of the next page so the download can be resumed.
+
+        :param query: The query filters.
+        :type query: dict
+        :param n_max: The maximum number of entities to download. If None, all the entities are downloaded.
+        :type n_max: int | None
+        :param update_progress: Function called with the number of entities downloaded after each page. The default
+            value is None.
+        :type update_progress: Callable[[int], None] | None
+        :param segments_folder_path: The folder in which to write the parquet segments. The default value is None to
+            keep all the entities in memory.
+        :type segments_folder_path: str | None
+        :param shard_index: The index of the shard downloaded, used to name the segments. The default value is 0.
+        :type shard_index: int
+        :param cursor: The cursor of the first page to download. The default value is "*" to start from the beginning.
+        :type cursor: str
+        :param segment_index: The index of the first segment to write. The default value is 0.
+        :type segment_index: int
+        :param save_checkpoint: Function called with (next_cursor, n_entities_written, n_segments) after each segment
+            written. The default value is None.
+        :type save_checkpoint: Callable[[str | None, int, int], None] | None
+        :param columns: Only download these columns (see get_api_select()). The default value is None to download all
+            the columns.
+        :type columns: list[str] | None
+        :return: The list of entities downloaded (PyAlex objects). Empty if the entities were written in segments.
+        :rtype: list
+        """
+        entities_list = []
+        n_entities_written = 0
+
+        def write_segment():
+            nonlocal entities_list, segment_index, n_entities_written
+            self.write_parquet_segment(entities_list, segments_folder_path, shard_index, segment_index)
+            segment_index += 1
+            n_entities_written += len(entities_list)
+            entities_list = []
+            # the cursor of the pager points to the next page to download (private attribute of the PyAlex Paginator,
+            # without it no checkpoint is saved and an interrupted download restarts from the beginning)
+            if save_checkpoint is not None and hasattr(pager, "_next_value"):
+                save_checkpoint(pager._next_value, n_entities_written, segment_index)
+
+        # create the pager entity to iterate over the pages of entities to download
+        entity_query = self.EntityOpenAlex().filter(**query)
+        if columns is not None:
+            entity_query = entity_query.select(self.get_api_select(columns))
+        pager = entity_query.paginate(per_page=self.per_page, cursor=cursor, n_max=n_max)
+        n_entities_downloaded = 0
+        for page in pager:
+            if n_max is not None:
+                # the last page can go beyond n_max (e.g. when a download is resumed in the middle of a page)
+                page = page[:n_max - n_entities_downloaded]
+            n_entities_downloaded += len(page)
+            for entity in page:
+                self.filter_and_format_entity_data_from_api_response(entity)
+            entities_list.extend(page)
+            if update_progress is not None:
+                update_progress(len(page))
+            if segments_folder_path is not None and len(entities_list) >= config.streaming_buffer_size:
+                write_segment()
+        if segments_folder_path is not None:
+            if entities_list:
+                write_segment()
+            elif save_checkpoint is not None:
+                # mark the shard as done
+                save_checkpoint(None, n_entities_written, segment_index)
+            return []
+        return entities_list
+
+
+    def write_parquet_segment(self, entities_list: list, segments_folder_path: str, shard_index: int,
+                              segment_index: int):
+        """
+        Converts a batch of entities to an Arrow table and writes it as a parquet segment.
+
+        :param entities_list: The list of entities (PyAlex objects).
+        :type entities_list: list
+        :param segments_folder_path: The folder in which to write the segment.
+        :type segments_folder_path: str
+        :param shard_index: The index of the shard downloaded.
+        :type shard_index: int
+        :param segment_index: The index of the segment in the shard.
+        :type segment_index: int
+        """
+        os.makedirs(segments_folder_path, exist_ok=True)
+        table = self.convert_entities_list_to_table(entities_list)
+        # the segments are temporary, so we use a fast compression
+        pq.write_table(table, join(segments_folder_path, f"{shard_index:05d}-{segment_index:06d}.parquet"),
+                       compression="snappy")
+
+
+    def load_download_checkpoint(self, segments_folder_path: str, query: dict,
+                                 columns: list[str] | None = None) -> dict | None:
+        """
+        Loads the checkpoint of a partial streaming download of the query. The segments written after the last
+        checkpoint (e.g. if the download was interrupted before the checkpoint was saved) are removed.
+
+        :param segments_folder_path: The folder containing the parquet segments and the checkpoint.
+        :type segments_folder_path: str
+        :param query: The query filters of the download.
+        :type query: dict
+        :param columns: The columns downloaded (None for all the columns). The default value is None.
+        :type columns: list[str] | None
+        :return: The checkpoint, or None if there is no valid checkpoint for this query.
+        :rtype: dict | None
+        """
+        checkpoint_path = join(segments_folder_path, "checkpoint.json")
+        if not isfile(checkpoint_path):
+            return None
+        try:
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            warnings.warn(f"Could not read the download checkpoint {checkpoint_path}, restarting the download.")
+            return None
+        if (checkpoint.get('query') != json.dumps(query, sort_keys=True, default=str)
+                or checkpoint.get('columns') != columns):
+            log_oa.info("The download checkpoint doesn't match the query, restarting the download")
+            return None
+        # remove the segments which were written after the last checkpoint
+        for file in os.listdir(segments_folder_path):
+            if file.endswith(".parquet"):
+                shard_index, segment_index = (int(i) for i in file.removesuffix(".parquet").split("-"))
+                if segment_index >= checkpoint['shards'][shard_index]['n_segments']:
+                    os.remove(join(segments_folder_path, file))
+        return checkpoint
+
+
+    def get_partial_download_checkpoint(self) -> dict | None:
+        """
+        Gets the checkpoint of the partial streaming download of the dataset of the instance (see
+        download_list_entities()), if it can be resumed. A partial download which can't be resumed (e.g. of another
+        query or with other columns) is removed.
+
+        :return: The checkpoint, or None if there is no partial download to resume.
+        :rtype: dict | None
+        """
+        segments_folder_path = self.database_file_path + ".part"
+        if not isdir(segments_folder_path):
+            return None
+        checkpoint = self.load_download_checkpoint(segments_folder_path, self.get_api_query(),
+                                                   self.get_dataset_columns_needed())
+        if checkpoint is None:
+            log_oa.info(f"Removing the partial download {segments_folder_path} which can't be resumed")
+            shutil.rmtree(segments_folder_path)
+        return checkpoint
+
+
     def download_list_entities(self):
         """
         Downloads the entities which match the parameters of the instance, and store the dataset as a parquet file .
+        In streaming mode (config.streaming_download), the download is checkpointed after each segment written. A
+        partial streaming download of the same query is resumed from its last checkpoint, even if the streaming mode
+        was disabled since.
         """
         log_oa.info(f"Downloading list of {self.get_entity_type_string_name()}")
         if self.entity_from_id is not None:
@@ -293,95 +940,395 @@ class EntitiesData:
 
         query = self.get_api_query()
         log_oa.info(f"Query to download from the API: {query}")
+        columns = self.get_dataset_columns_needed()
+        if columns is not None:
+            log_oa.info(f"Columns to download: {columns}")
 
-        count_entities_matched = self.get_count_entities_matched(query)
+        if not isdir(config.project_data_folder_path):
+            log_oa.info("Creating the directory to store the data from OpenAlex")
+            os.makedirs(config.project_data_folder_path)
 
-        if config.n_max_entities is None or config.n_max_entities > count_entities_matched:
-            n_entities_to_download = count_entities_matched
-            print(f"All the {n_entities_to_download} entities will be downloaded")
-            log_oa.info(f"All the {n_entities_to_download} entities will be downloaded")
+        # the entities updated after this date will be downloaded by an incremental refresh of the dataset
+        sync_date = datetime.now(timezone.utc).date().isoformat()
+
+        # in streaming mode (or to resume a partial streaming download), the entities are written in parquet segments
+        # as they are downloaded
+        checkpoint = self.get_partial_download_checkpoint()
+        segments_folder_path = None
+        if checkpoint is not None or config.streaming_download:
+            segments_folder_path = self.database_file_path + ".part"
+
+        if checkpoint is not None:
+            n_entities_to_download = checkpoint['n_entities_to_download']
+            sync_date = checkpoint.get('sync_date', sync_date)
+            n_entities_downloaded = sum(shard['n_downloaded'] for shard in checkpoint['shards'])
+            log_oa.info(f"Resuming the download from {n_entities_downloaded} entities (out of "
+                        f"{n_entities_to_download})")
+            shards = [query if shard['value'] is None else query | {self.download_shard_key: shard['value']}
+                      for shard in checkpoint['shards']]
         else:
-            n_entities_to_download = config.n_max_entities
-            print(f"Only {n_entities_to_download} entities will be downloaded (out of {count_entities_matched})")
-            log_oa.info(f"Only {n_entities_to_download} entities will be downloaded (out of {count_entities_matched})")
-
-        # create a list to store the entities
-        entities_list = [None] * n_entities_to_download
-
-        # create the pager entity to iterate over the pages of entities to download
-        pager = self.EntityOpenAlex().filter(**query).paginate(per_page=self.per_page, n_max=n_entities_to_download)
+            count_entities_matched = self.get_count_entities_matched(query)
+
+            if config.n_max_entities is None or config.n_max_entities > count_entities_matched:
+                n_entities_to_download = count_entities_matched
+                print(f"All the {n_entities_to_download} entities will be downloaded")
+                log_oa.info(f"All the {n_entities_to_download} entities will be downloaded")
+            else:
+                n_entities_to_download = config.n_max_entities
+                print(f"Only {n_entities_to_download} entities will be downloaded (out of {count_entities_matched})")
+                log_oa.info(f"Only {n_entities_to_download} entities will be downloaded (out of "
+                            f"{count_entities_matched})")
+
+            n_entities_downloaded = 0
+            shards = self.get_download_shards(query, n_entities_to_download, count_entities_matched)
+            if segments_folder_path is not None:
+                checkpoint = {
+                    'query': json.dumps(query, sort_keys=True, default=str),
+                    'columns': columns,
+                    'n_entities_to_download': n_entities_to_download,
+                    'sync_date': sync_date,
+                    'shards': [{'value': shard.get(self.download_shard_key) if len(shards) > 1 else None,
+                                'cursor': "*",
+                                'n_downloaded': 0,
+                                'n_segments': 0,
+                                } for shard in shards],
+                }
+
+        checkpoint_lock = threading.Lock()
+
+        def save_checkpoint(shard_index: int, cursor: str | None, n_downloaded: int, n_segments: int):
+            # the shards are downloaded in different threads, so we lock the checkpoint update
+            with checkpoint_lock:
+                checkpoint['shards'][shard_index] |= {'cursor': cursor, 'n_downloaded': n_downloaded,
+                                                      'n_segments': n_segments}
+                # write in a temporary file and rename it, so the checkpoint is never left truncated
+                with open(join(segments_folder_path, "checkpoint.json.tmp"), "w") as f:
+                    json.dump(checkpoint, f)
+                os.replace(join(segments_folder_path, "checkpoint.json.tmp"),
+                           join(segments_folder_path, "checkpoint.json"))
+
+        def download_shard(shard_index: int) -> list:
+            n_max = n_entities_to_download if len(shards) == 1 else None
+            if checkpoint is None:
+                return self.download_entities_of_query(shards[shard_index], n_max, update_progress, columns=columns)
+            shard_checkpoint = checkpoint['shards'][shard_index]
+            n_downloaded_before = shard_checkpoint['n_downloaded']
+            if n_max is not None:
+                n_max -= n_downloaded_before
+            if shard_checkpoint['cursor'] is None or (n_max is not None and n_max <= 0):
+                # this shard was completely downloaded before
+                return []
+
+            def save_shard_checkpoint(cursor: str | None, n_entities_written: int, n_segments: int):
+                save_checkpoint(shard_index, cursor, n_downloaded_before + n_entities_written, n_segments)
+
+            return self.download_entities_of_query(shards[shard_index], n_max, update_progress, segments_folder_path,
+                                                   shard_index, shard_checkpoint['cursor'],
+                                                   shard_checkpoint['n_segments'], save_shard_checkpoint, columns)
 
         log_oa.info("Downloading the list of entities thought the OpenAlex API...")
-        with tqdm(total=n_entities_to_download, disable=config.disable_tqdm_loading_bar) as pbar:
-            i = 0
+        with tqdm(total=n_entities_to_download, initial=n_entities_downloaded,
+                  disable=config.disable_tqdm_loading_bar) as pbar:
             self.entity_downloading_progress_percentage = 0
-            for page in pager:
-                # add the downloaded entities in the main list
-                for entity in page:
-                    self.filter_and_format_entity_data_from_api_response(entity)
-                    if i < n_entities_to_download:
-                        entities_list[i] = entity
-                    else:
-                        # useless ?
-                        entities_list.append(entity)
-                        warnings.warn("entities_list was too short, appending the entity")
-                    i += 1
-                # update the progress bar
-                pbar.update(self.per_page)
-                # update the progress percentage variable
-                self.entity_downloading_progress_percentage = i / n_entities_to_download * 100 if i else 0
+            progress_lock = threading.Lock()
+
+            def update_progress(n_entities_downloaded: int):
+                # the shards are downloaded in different threads, so we lock the progress update
+                with progress_lock:
+                    pbar.update(n_entities_downloaded)
+                    if n_entities_to_download:
+                        self.entity_downloading_progress_percentage = min(pbar.n / n_entities_to_download * 100, 100)
+
+            if segments_folder_path is not None:
+                os.makedirs(segments_folder_path, exist_ok=True)
+            if len(shards) == 1:
+                entities_list = download_shard(0)
+            else:
+                log_oa.info(f"Downloading {len(shards)} shards with {config.n_parallel_downloads} threads...")
+                with ThreadPoolExecutor(max_workers=config.n_parallel_downloads) as executor:
+                    futures = [executor.submit(download_shard, i) for i in range(len(shards))]
+                    # merge the shards in the order they were created
+                    entities_list = [entity for future in futures for entity in future.result()]
         self.entity_downloading_progress_percentage = 100
 
-        log_oa.info("Converting the entities list downloaded to a DataFrame...")
-        entities_list_df = self.convert_entities_list_to_df(entities_list)
-
+        log_oa.info("Checking space left on disk...")
+        self.auto_remove_databases_saved()
+        partition_key = self.get_dataset_partition_key()
+        # the rows are in the order of the API only if the query wasn't split and the dataset isn't partitioned
+        dataset_metadata = {'last_sync_date': sync_date,
+                            'api_order': str(len(shards) == 1 and partition_key is None).lower()}
+        if columns is not None:
+            dataset_metadata['columns'] = json.dumps(columns)
+        if segments_folder_path is not None:
+            log_oa.info("Merging the parquet segments downloaded in a parquet file...")
+            merge_parquet_segments(segments_folder_path, self.database_file_path, dataset_metadata, partition_key)
+        else:
+            log_oa.info("Converting the entities list downloaded to an Arrow table...")
+            entities_table = self.convert_entities_list_to_table(entities_list)
+            # save as compressed parquet file
+            log_oa.info("Saving the list of entities as a parquet file...")
+            write_parquet_dataset(entities_table, self.database_file_path, dataset_metadata, partition_key)
+        self.write_edge_tables()
+        self.update_cache_manifest()
+
+    def download_datasets_of_entities_from(self,
+                                           entities_from_ids: list[str],
+                                           extra_filters: dict | None = None,
+                                           load_only_columns: list[str] | None = None):
+        """
+        Downloads at once the datasets of several entities from (e.g. the works of several institutions) which aren't
+        cached yet, with an OR filter on batches of entities from (e.g. institutions.id:I1|I2|...). The entities shared
+        by several entities from (e.g. the works co-authored by two institutions) are only downloaded once, and the
+        entities downloaded are split locally into the dataset of each entity from, which is cached as if it was
+        downloaded alone. The entities from which can't be downloaded this way (e.g. a filter without
+        entities_from_fields, or more entities than config.n_max_entities as their dataset would be truncated) are left
+        to the normal download when their dataset is loaded.
+
+        :param entities_from_ids: The entities from identifiers.
+        :type entities_from_ids: list[str]
+        :param extra_filters: The extra filters of the datasets (see __init__()). The default value is None.
+        :type extra_filters: dict | None
+        :param load_only_columns: The columns the datasets will be loaded with (see __init__()). The default value is
+            None.
+        :type load_only_columns: list[str] | None
+        """
+        datasets_per_filter = {}
+        for entity_from_id in dict.fromkeys(entities_from_ids):
+            dataset = type(self)(entity_from_id, extra_filters=extra_filters, create_dataframe=False,
+                                 load_only_columns=load_only_columns)
+            if (exists(dataset.database_file_path) or isdir(dataset.database_file_path + ".part")
+                    or not is_in_cache_folder(dataset.database_file_path)
+                    or dataset.find_superset_database_file()[0] is not None):
+                continue
+            filter_key, _ = get_filter_key_and_value(dataset.get_entity_from_filter())
+            if filter_key not in self.entities_from_fields:
+                continue
+            if (config.n_max_entities is not None
+                    and dataset.get_count_entities_matched(dataset.get_api_query()) >= config.n_max_entities):
+                continue
+            datasets_per_filter.setdefault(filter_key, []).append(dataset)
+
+        for filter_key, datasets in datasets_per_filter.items():
+            for i in range(0, len(datasets), self.bulk_download_batch_size):
+                batch = datasets[i:i + self.bulk_download_batch_size]
+                log_oa.info(f"Downloading the {self.get_entity_type_string_name()} of {len(batch)} entities at once")
+                self.download_and_split_datasets_of_entities_from(filter_key, batch, extra_filters)
+
+    def download_and_split_datasets_of_entities_from(self,
+                                                     filter_key: str,
+                                                     datasets: list,
+                                                     extra_filters: dict | None = None):
+        """
+        Downloads the entities of several entities from with an OR filter, and writes the dataset of each entity from
+        (see download_datasets_of_entities_from()).
+
+        :param filter_key: The key of the API filter on the entities from (e.g. "institutions.id").
+        :type filter_key: str
+        :param datasets: The instances of the datasets to write, one per entity from.
+        :type datasets: list[EntitiesData]
+        :param extra_filters: The extra filters of the datasets. The default value is None.
+        :type extra_filters: dict | None
+        """
         if not isdir(config.project_data_folder_path):
-            log_oa.info("Creating the directory to store the data from OpenAlex")
             os.makedirs(config.project_data_folder_path)
-        log_oa.info("Checking space left on disk...")
+        query = get_filter_from_key_and_value(filter_key, '|'.join(dataset.entity_from_id for dataset in datasets))
+        if extra_filters is not None:
+            query = query | extra_filters
+        columns = datasets[0].get_dataset_columns_needed()
+        # the field used to split the entities is downloaded even if it isn't needed in the datasets
+        split_field_path = self.entities_from_fields[filter_key]
+        download_columns = None if columns is None else list(dict.fromkeys(columns + [split_field_path[0]]))
+        sync_date = datetime.now(timezone.utc).date().isoformat()
+        count_entities_matched = self.get_count_entities_matched(query)
+        shards = self.get_download_shards(query, count_entities_matched, count_entities_matched)
+        with tqdm(total=count_entities_matched, disable=config.disable_tqdm_loading_bar) as pbar:
+            progress_lock = threading.Lock()
+
+            def update_progress(n_entities_downloaded: int):
+                with progress_lock:
+                    pbar.update(n_entities_downloaded)
+
+            with ThreadPoolExecutor(max_workers=max(1, min(config.n_parallel_downloads, len(shards)))) as executor:
+                futures = [executor.submit(self.download_entities_of_query, shard, None, update_progress,
+                                           columns=download_columns) for shard in shards]
+                entities_list = [entity for future in futures for entity in future.result()]
+        entities_table = self.convert_entities_list_to_table(entities_list)
+        log_oa.info(f"{entities_table.num_rows} {self.get_entity_type_string_name()} downloaded for "
+                    f"{len(datasets)} entities")
+
         self.auto_remove_databases_saved()
-        # save as compressed parquet file
-        log_oa.info("Saving the list of entities as a parquet file...")
-        entities_list_df.to_parquet(self.database_file_path, compression=config.parquet_compression)
+        rows_index, entities_from_ids = get_nested_field_values(entities_table, split_field_path)
+        entities_from_ids = intern_openalex_ids(entities_from_ids)
+        for dataset in datasets:
+            entity_from_id = intern_openalex_ids(pa.array([dataset.entity_from_id], pa.string()))[0]
+            # the rows index are sorted, so the entities keep the order of the download
+            entity_rows_index = pc.unique(pc.filter(rows_index, pc.equal(entities_from_ids, entity_from_id)))
+            dataset_table = entities_table.take(entity_rows_index)
+            if columns is not None:
+                stored_columns = [self.lazy_columns.get(column, column) for column in columns]
+                dataset_table = dataset_table.select([column for column in dataset_table.column_names
+                                                      if column in columns or column in stored_columns])
+            dataset_metadata = {'last_sync_date': sync_date, 'api_order': 'false'}
+            if columns is not None:
+                dataset_metadata['columns'] = json.dumps(columns)
+            write_parquet_dataset(dataset_table, dataset.database_file_path, dataset_metadata,
+                                  dataset.get_dataset_partition_key())
+            dataset.write_edge_tables()
+            dataset.update_cache_manifest()
+
+    def refresh_entities_dataset(self) -> bool:
+        """
+        Refreshes the cached dataset incrementally: only the entities updated since the last synchronisation date
+        stored in the parquet file are downloaded, and they replace (or are added to) the entities of the dataset with
+        the same id. The file is rewritten atomically. The entities which no longer match the query (e.g. deleted or
+        merged entities) are not removed from the dataset, a full download is needed to remove them.
+
+        :return: True if the dataset was refreshed, False if it can't be refreshed incrementally (e.g. no
+            synchronisation date in the file, dataset limited by n_max_entities or API error) and needs to be
+            downloaded again.
+        :rtype: bool
+        """
+        last_sync_date = get_last_sync_date(self.database_file_path)
+        if last_sync_date is None:
+            log_oa.info(f"No synchronisation date in {self.database_file_path}, can't refresh it incrementally")
+            return False
+        entities_table = read_dataset_table(self.database_file_path)
+        # a dataset limited by n_max_entities contains the first entities returned by the API, adding the updated
+        # entities would break this
+        if config.n_max_entities is not None and entities_table.num_rows >= config.n_max_entities:
+            log_oa.info(f"The dataset {self.database_file_path} is limited by n_max_entities, can't refresh it "
+                        f"incrementally")
+            return False
 
-    def load_entities_dataframe(self):
+        sync_date = datetime.now(timezone.utc).date().isoformat()
+        query = self.get_api_query() | {'from_updated_date': last_sync_date}
+        log_oa.info(f"Downloading the entities updated since {last_sync_date}...")
+        try:
+            updated_entities_list = self.download_entities_of_query(
+                query, None, columns=get_dataset_columns(self.database_file_path))
+        except (requests.exceptions.RequestException, pyalex.api.QueryError) as e:
+            warnings.warn(f"Could not download the entities updated since {last_sync_date} ({e}), the dataset will be "
+                          f"downloaded again.")
+            return False
+        log_oa.info(f"{len(updated_entities_list)} entities updated since {last_sync_date}")
+
+        if updated_entities_list:
+            updated_entities_table = self.convert_entities_list_to_table(updated_entities_list)
+            if entities_table.num_rows == 0:
+                entities_table = updated_entities_table
+            else:
+                # upsert: remove the old version of the updated entities and add the new ones
+                entities_table = entities_table.filter(
+                    pc.invert(pc.is_in(entities_table['id'], value_set=updated_entities_table['id'])))
+                schema = pa.unify_schemas([entities_table.schema.remove_metadata(),
+                                           updated_entities_table.schema.remove_metadata()],
+                                          promote_options="permissive")
+                entities_table = pa.concat_tables([conform_table_to_schema(entities_table, schema),
+                                                   conform_table_to_schema(updated_entities_table, schema)])
+        dataset_metadata = get_dataset_metadata(self.database_file_path) | {'last_sync_date': sync_date}
+        if updated_entities_list:
+            # the updated entities are appended at the end of the dataset, so it's not in the order of the API anymore
+            dataset_metadata['api_order'] = 'false'
+        write_parquet_dataset(entities_table, self.database_file_path, dataset_metadata,
+                              self.get_dataset_partition_key())
+        self.write_edge_tables()
+        self.update_cache_manifest()
+        return True
+
+    def load_entities_dataframe(self, filters: list | None = None):
         """
         Loads an entities dataset from file (or download it if needed and allowed by the instance) to the dataframe of
         the instance.
+
+        :param filters: Load only the rows matching these filters (pyarrow filters format, e.g.
+            [('publication_year', 'in', [2020, 2021])]). With a partitioned dataset (see config.partition_datasets),
+            only the partitions matching the filters are read. The default value is None to use the load_filters of the
+            instance.
+        :type filters: list | None
         """
+        if filters is None:
+            filters = self.load_filters
         log_oa.info(f"Loading dataframe of {self.get_entity_type_string_name()}")
         if self.entity_from_id is not None:
             log_oa.info(f"of the {self.get_entity_type_string_name(self.entity_from_type)[0:-1]} {self.entity_from_id}")
         if self.extra_filters is not None:
             log_oa.info(f"with extra filters: {self.extra_filters}")
+        self.update_entities_dataset()
+        log_oa.info("Loading the list of entities from a parquet file...")
+        touch_file_in_cache_manifest(self.database_file_path)
+        try:
+            columns = self.get_dataset_columns_to_read()
+            dataset_columns = get_dataset_schema(self.database_file_path).names
+            decode_lazy_columns = any(stored_column in dataset_columns and (columns is None or stored_column in columns)
+                                      for stored_column in self.lazy_columns.values())
+            if is_arrow_dataset(self.database_file_path):
+                # the ArrowDtype columns use the memory-mapped file, nothing is decoded or copied
+                self.entities_df = self.decode_lazy_columns(read_dataset_table(
+                    self.database_file_path, columns, filters, self.database_n_rows_limit
+                )).to_pandas(types_mapper=pd.ArrowDtype)
+            elif self.database_n_rows_limit is not None or decode_lazy_columns:
+                self.entities_df = self.decode_lazy_columns(read_dataset_table(
+                    self.database_file_path, columns, filters, self.database_n_rows_limit)).to_pandas()
+            else:
+                self.entities_df = pd.read_parquet(self.database_file_path, columns=columns,
+                                                   filters=filters, **get_dataset_read_options(self.database_file_path))
+        except:
+            # TODO: better manage the exception
+            # couldn't load the parquet file (eg no row in parquet file so error because can't find columns to load)
+            self.entities_df = pd.DataFrame()
+        whole_dataset_loaded = (filters is None and self.database_n_rows_limit is None
+                                and exists(self.database_file_path))
+        self.whole_dataset_entities_df = self.entities_df if whole_dataset_loaded else None
 
+    def update_entities_dataset(self):
+        """
+        Makes sure the dataset of the instance is cached and up to date without loading it: downloads it (or uses a
+        cached superset), refreshes it if it is older than config.cache_max_age, or adds the missing columns.
+        """
         # # check if the database file exists
         if not exists(self.database_file_path):
-            self.download_list_entities()
+            superset_file_path = None
+            if self.get_partial_download_checkpoint() is not None:
+                log_oa.info(f"Found a partial download in {self.database_file_path}.part")
+            elif is_in_cache_folder(self.database_file_path):
+                superset_file_path, self.database_n_rows_limit = self.find_superset_database_file()
+            if superset_file_path is not None:
+                log_oa.info(f"Using the cached dataset {superset_file_path} which contains the entities needed")
+                self.database_file_path = superset_file_path
+            else:
+                self.download_list_entities()
         # check the age of the cache (aka last date of modification)
         else:
             age_in_days = (time() - os.stat(self.database_file_path).st_mtime) / 86400
             if age_in_days > config.cache_max_age:
-                os.remove(self.database_file_path)
-                log_oa.info(f"Removed file {self.database_file_path} (age (days): {int(age_in_days)})")
+                if config.cache_refresh_mode == 'incremental' and self.refresh_entities_dataset():
+                    log_oa.info(f"Refreshed file {self.database_file_path} (age (days): {int(age_in_days)})")
+                else:
+                    remove_dataset(self.database_file_path)
+                    remove_file_from_cache_manifest(self.database_file_path)
+                    log_oa.info(f"Removed file {self.database_file_path} (age (days): {int(age_in_days)})")
+                    self.download_list_entities()
+            # the dataset could have been downloaded with other columns
+            dataset_columns = get_dataset_columns(self.database_file_path)
+            columns_needed = self.get_dataset_columns_needed()
+            if dataset_columns is not None and columns_needed is None:
+                log_oa.info(f"The file {self.database_file_path} only has the columns {dataset_columns}, downloading "
+                            f"the dataset again with all the columns")
+                remove_dataset(self.database_file_path)
+                remove_file_from_cache_manifest(self.database_file_path)
                 self.download_list_entities()
-        log_oa.info("Loading the list of entities from a parquet file...")
-        try:
-            self.entities_df = pd.read_parquet(self.database_file_path, columns=self.load_only_columns)
-        except:
-            # TODO: better manage the exception
-            # couldn't load the parquet file (eg no row in parquet file so error because can't find columns to load)
-            self.entities_df = pd.DataFrame()
+            elif dataset_columns is not None and not set(columns_needed) <= set(dataset_columns):
+                self.add_columns_to_dataset([column for column in columns_needed if column not in dataset_columns])
 
     def auto_remove_databases_saved(self):
         """
         Remove databases files (the cached data downloaded from OpenAlex) if the storage is full, if there are too many
         files or if the cache uses too much space. It keeps the last accessed files with a minimum of files number, and
-        folder size.
+        folder size. The number of files, their size and their last access time are read from the cache manifest, so
+        the cache folder isn't scanned. Only the cached datasets are counted in the number of files and the size of the
+        cache: the other files of the cache folder (e.g. the SQLite caches or the partial downloads) aren't.
         """
-        def max_cache_storage_usage_reached():
-            nb_files = len(os.listdir(config.project_data_folder_path))
-            size = sum(f.stat().st_size for f in Path(config.project_data_folder_path).glob('**/*') if f.is_file())
+        def max_cache_storage_usage_reached(nb_files: int, size: int) -> bool:
             # if we are reaching the threshold to delete the cache (this is useful if the program is running on a system
             # with a nearly full disk to avoid the limit from config.max_storage_percent to delete every cached file),
             # we check that one of the minimum of files number of folder size is exceeded:
@@ -394,29 +1341,188 @@ class EntitiesData:
                     return True
             return False
 
+        with cache_manifest_lock:
+            connection = connect_cache_manifest()
+            nb_files, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_files").fetchone()
+            while max_cache_storage_usage_reached(nb_files, size):
+                # least recently used file
+                first_accessed_file = connection.execute(
+                    "SELECT file, size, atime FROM cache_files ORDER BY atime LIMIT 1").fetchone()
+                if first_accessed_file is None:
+                    warnings.warn("No more file to delete.")
+                    warnings.warn(f"Space used on disk: {psutil.disk_usage(config.project_data_folder_path).percent} %")
+                    break
+                file, file_size, first_accessed_file_time = first_accessed_file
+                if exists(join(config.project_data_folder_path, file)):
+                    remove_dataset(join(config.project_data_folder_path, file))
+                    log_oa.info(f"Removed file {join(config.project_data_folder_path, file)} "
+                                f"(last used: {first_accessed_file_time})")
+                with connection:
+                    connection.execute("DELETE FROM cache_files WHERE file = ?", (file,))
+                nb_files -= 1
+                size -= file_size
+            connection.close()
+
+
+    def update_cache_manifest(self):
+        """
+        Adds (or updates) the database file of the instance in the cache manifest, with its size, access time, entity
+        type, query and number of rows. Only the files in config.project_data_folder_path are managed by the cache.
+        """
+        if not is_in_cache_folder(self.database_file_path) or not exists(self.database_file_path):
+            return
+        try:
+            n_rows = get_dataset_n_rows(self.database_file_path)
+        except (OSError, pa.ArrowInvalid):
+            n_rows = None
+        add_file_to_cache_manifest(self.database_file_path, self.get_entity_type_string_name(),
+                                   json.dumps(self.get_api_query(), sort_keys=True, default=str), n_rows)
 
-        while max_cache_storage_usage_reached():
-            first_accessed_file = None
-            first_accessed_file_time = 0
-            for file in os.listdir(config.project_data_folder_path):
-                if file.endswith(".parquet"):
-                    if os.stat(join(config.project_data_folder_path,
-                                    file)).st_atime < first_accessed_file_time or first_accessed_file_time == 0:
-                        first_accessed_file_time = os.stat(join(config.project_data_folder_path, file)).st_atime
-                        first_accessed_file = file
-            if first_accessed_file is None:
-                warnings.warn("No more file to delete.")
-                warnings.warn(f"Space used on disk: {psutil.disk_usage(config.project_data_folder_path).percent} %")
-                break
-            os.remove(join(config.project_data_folder_path, first_accessed_file))
-            log_oa.info(f"Removed file {join(config.project_data_folder_path, first_accessed_file)} "
-                        f"(last used: {first_accessed_file_time})")
 
+    def find_superset_database_file(self) -> tuple[str | None, int | None]:
+        """
+        Finds a fresh cached dataset of the same query downloaded with a different n_max_entities which contains the
+        entities needed with the current n_max_entities, so they don't need to be downloaded again. A dataset can be
+        used if it is complete (it has fewer entities than its n_max_entities, or it is unlimited), or if it contains at
+        least n_max_entities entities in the order returned by the API (its first rows are then the entities a limited
+        download would return). It must also have the columns needed.
+
+        :return: The path of the dataset and the number of rows to load from it (None to load all the rows), or
+            (None, None) if no cached dataset can be used.
+        :rtype: tuple[str | None, int | None]
+        """
+        n_max_entities = config.n_max_entities
+        columns_needed = self.get_dataset_columns_needed()
+        file_name_prefix = os.path.basename(self.database_file_path).rsplit("_max_", 1)[0] + "_max_"
+        file_extension = os.path.splitext(self.database_file_path)[1]
+        candidates = []
+        for file, mtime in get_cached_files(self.get_entity_type_string_name()).items():
+            if not file.startswith(file_name_prefix) or not file.endswith(file_extension):
+                continue
+            file_path = join(config.project_data_folder_path, file)
+            if (time() - mtime) / 86400 > config.cache_max_age or not exists(file_path):
+                continue
+            file_n_max_entities = file[len(file_name_prefix):-len(file_extension)]
+            if file_n_max_entities != "None" and not file_n_max_entities.isdigit():
+                continue
+            file_n_max_entities = None if file_n_max_entities == "None" else int(file_n_max_entities)
+            try:
+                n_rows = get_dataset_n_rows(file_path)
+                api_order = get_dataset_metadata(file_path).get('api_order') == 'true'
+                dataset_columns = get_dataset_columns(file_path)
+            except (OSError, pa.ArrowException):
+                continue
+            # the dataset must have the columns needed
+            if dataset_columns is not None and (columns_needed is None
+                                                or not set(columns_needed) <= set(dataset_columns)):
+                continue
+            complete = file_n_max_entities is None or n_rows < file_n_max_entities
+            if complete and (n_max_entities is None or n_rows <= n_max_entities):
+                candidates.append((n_rows, file_path, None))
+            elif n_max_entities is not None and n_rows >= n_max_entities and api_order:
+                candidates.append((n_rows, file_path, n_max_entities))
+        if not candidates:
+            return None, None
+        # the smallest dataset is the fastest to load
+        n_rows, file_path, n_rows_limit = min(candidates)
+        return file_path, n_rows_limit
+
+    def get_dataset_columns_needed(self) -> list[str] | None:
+        """
+        Gets the columns the dataset of the instance needs to have, according to load_only_columns and
+        config.download_only_loaded_columns. The id is always needed.
+
+        :return: The columns, or None if all the columns are needed.
+        :rtype: list[str] | None
+        """
+        if self.load_only_columns is None or not config.download_only_loaded_columns:
+            return None
+        return list(dict.fromkeys(['id'] + list(self.load_only_columns)))
+
+    def get_dataset_columns_to_read(self) -> list[str] | None:
+        """
+        Gets the columns to read in the dataset of the instance to load the columns of load_only_columns. The lazy
+        columns (see lazy_columns) are read from the column they are stored in, and skipped if the dataset doesn't
+        have them (e.g. the abstracts if config.download_abstracts is False).
+
+        :return: The columns to read, or None to read all the columns.
+        :rtype: list[str] | None
+        """
+        if self.load_only_columns is None:
+            return None
+        dataset_columns = get_dataset_schema(self.database_file_path).names
+        columns = []
+        for column in self.load_only_columns:
+            if column in self.lazy_columns:
+                # a dataset written by an older version or refreshed can have both columns
+                columns += [dataset_column for dataset_column in [column, self.lazy_columns[column]]
+                            if dataset_column in dataset_columns]
+            else:
+                columns.append(column)
+        return columns
+
+    def get_api_select(self, columns: list[str]) -> list[str]:
+        """
+        Gets the fields to select with the OpenAlex API to get columns of the dataset (e.g. the abstract of the works
+        is created from the field abstract_inverted_index).
+
+        :param columns: The columns of the dataset.
+        :type columns: list[str]
+        :return: The fields to select.
+        :rtype: list[str]
+        """
+        return list(dict.fromkeys(self.columns_api_fields.get(column, column) for column in columns))
+
+    def add_columns_to_dataset(self, columns: list[str]):
+        """
+        Downloads columns missing in the dataset of the instance, for the entities of the dataset (queried by id), and
+        adds them to the dataset. The modification date of the file is kept, so the columns added don't extend the
+        age of the cache.
+
+        :param columns: The columns to add.
+        :type columns: list[str]
+        """
+        log_oa.info(f"Downloading the columns {columns} missing in {self.database_file_path}...")
+        table = read_dataset_table(self.database_file_path)
+        ids = [entity_id[21:] for entity_id in table['id'].to_pylist()]
+        entities_list = [entity for entity in
+                         self.get_multiple_entities_from_id(ids, ordered=False, return_dataframe=False,
+                                                            columns=['id'] + columns) if entity is not None]
+        for entity in entities_list:
+            self.filter_and_format_entity_data_from_api_response(entity)
+        columns_table = self.convert_entities_list_to_table(entities_list)
+        # align the rows downloaded with the rows of the dataset (entities not found get null values)
+        rows_index = {entity_id: i for i, entity_id in enumerate(columns_table['id'].to_pylist())} \
+            if columns_table.num_rows else {}
+        columns_table = columns_table.take(pa.array([rows_index.get(entity_id) for entity_id in
+                                                     table['id'].to_pylist()], pa.int64()))
+        for column in columns:
+            # the lazy columns are stored in another column (e.g. the abstracts in abstract_inverted_index)
+            column = self.lazy_columns.get(column, column)
+            table = table.append_column(column, columns_table[column] if column in columns_table.column_names else
+                                        pa.nulls(table.num_rows))
+        dataset_metadata = get_dataset_metadata(self.database_file_path)
+        dataset_metadata['columns'] = json.dumps(json.loads(dataset_metadata['columns']) + columns)
+        mtime = os.stat(self.database_file_path).st_mtime
+        write_parquet_dataset(table, self.database_file_path, dataset_metadata, self.get_dataset_partition_key())
+        os.utime(self.database_file_path, (time(), mtime))
+        self.write_edge_tables()
+        self.update_cache_manifest()
+
+    def get_dataset_partition_key(self) -> str | None:
+        """
+        Gets the key used to partition the cached dataset of the instance.
+
+        :return: The partition key, or None if the dataset isn't partitioned (config.partition_datasets disabled, Arrow
+            cache format or entity type without partition key).
+        :rtype: str | None
+        """
+        return self.dataset_partition_key if config.partition_datasets and config.cache_format == 'parquet' else None
 
     def get_database_file_name(self,
                                entity_from_id: str | None = None,
                                entity_type: pyalex.api.BaseOpenAlex | None = None,
-                               db_format: str = "parquet"
+                               db_format: str | None = None
                                ) -> str:
         """
         Gets the database file name according to the parameters of the object or the arguments given.
@@ -427,8 +1533,8 @@ class EntitiesData:
         :param entity_type: The entity type in the database (e.g. works). If nothing is provided, the instance entity id
             will be used. Default is None.
         :type entity_type: pyalex.api.BaseOpenAlex | None
-        :param db_format: The database file format. The default is "parquet".
-        :type db_format: str
+        :param db_format: The database file format. The default is None to use the cache format (config.cache_format).
+        :type db_format: str | None
         :return: The database file name
         :rtype: str
         """
@@ -436,6 +1542,8 @@ class EntitiesData:
             entity_from_id = self.entity_from_id
         if entity_type is None:
             entity_type = self.EntityOpenAlex
+        if db_format is None:
+            db_format = config.cache_format
         file_name = self.get_entity_type_string_name(entity_type)
         if entity_from_id is not None:
             file_name += "_from_" + entity_from_id
@@ -520,9 +1628,11 @@ class EntitiesData:
 
     def get_multiple_entities_from_id(self, ids: list[str],
                                       ordered: bool = True,
-                                      return_dataframe: bool = True) -> pd.DataFrame | list:
+                                      return_dataframe: bool = True,
+                                      columns: list[str] | None = None) -> pd.DataFrame | list:
         """
-        Get multiple entities from their OpenAlex IDs by querying them to the OpenAlex API 100 by 100.
+        Get multiple entities from their OpenAlex IDs by querying them to the OpenAlex API 100 by 100. The batches
+        of 100 ids are queried in parallel with config.n_parallel_downloads threads.
 
         :param ids: the list of OpenAlex IDs to query
         :type ids: list[str]
@@ -531,19 +1641,26 @@ class EntitiesData:
         :param return_dataframe: Return a Dataframe. If True, the DataFrame returned will also be stored in
             self.entities_df and the cache system will be used. If False, a list will be returned. Default is True.
         :type return_dataframe: bool
+        :param columns: Only get these columns (see get_api_select()). Default is None to get all the columns.
+        :type columns: list[str] | None
         :return: the list of entities as pyalex objects (dictionaries) or DataFrame.
         :rtype: pd.DataFrame | list
         """
-        res = [] * len(ids)
-        i = 0
+        def get_batch(batch_ids: list[str]) -> list:
+            entity_query = self.EntityOpenAlex().filter(ids={'openalex': '|'.join(batch_ids)})
+            if columns is not None:
+                entity_query = entity_query.select(self.get_api_select(columns))
+            return entity_query.get(per_page=100)
+
+        # reduce 100 if too big for OpenAlex
+        batches = [ids[i:i+100] for i in range(0, len(ids), 100)]
+        res = []
         with tqdm(total=len(ids), disable=config.disable_tqdm_loading_bar) as pbar:
-            # reduce 100 if too big for OpenAlex
-            while i + 100 < len(ids):
-                res[i:i+100] = self.EntityOpenAlex().filter(ids={'openalex': '|'.join(ids[i:i+100])}).get(per_page=100)
-                i += 100
-                pbar.update(100)
-            res[i:] = self.EntityOpenAlex().filter(ids={'openalex': '|'.join(ids[i:])}).get(per_page=100)
-            pbar.update(len(ids) % 100)
+            # the batches are queried in parallel, map() returns the results in the order of the batches
+            with ThreadPoolExecutor(max_workers=config.n_parallel_downloads) as executor:
+                for batch, batch_res in zip(batches, executor.map(get_batch, batches)):
+                    res.extend(batch_res)
+                    pbar.update(len(batch))
 
         if ordered:
             # sort the res list with the order provided in the list ids
@@ -561,6 +1678,771 @@ class EntitiesData:
             res = self.convert_entities_list_to_df(res)
         return res
 
+cache_manifest_lock = threading.Lock()
+
+
+def is_in_cache_folder(file_path: str) -> bool:
+    """
+    Checks if a file is in the cache folder (config.project_data_folder_path).
+
+    :param file_path: The file path.
+    :type file_path: str
+    :return: True if the file is in the cache folder.
+    :rtype: bool
+    """
+    return os.path.abspath(os.path.dirname(file_path)) == os.path.abspath(config.project_data_folder_path)
+
+
+def connect_cache_manifest() -> sqlite3.Connection:
+    """
+    Connects to the cache manifest, an SQLite database listing the cached parquet files with their size, last access
+    time, modification time, entity type, query and number of rows. When the manifest is created, the parquet files
+    already in the cache folder are added to it.
+
+    :return: The connection to the cache manifest.
+    :rtype: sqlite3.Connection
+    """
+    os.makedirs(config.project_data_folder_path, exist_ok=True)
+    manifest_path = join(config.project_data_folder_path, "cache_manifest.sqlite")
+    new_manifest = not isfile(manifest_path)
+    connection = sqlite3.connect(manifest_path, timeout=30)
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS cache_files (file TEXT PRIMARY KEY, size INTEGER, atime REAL, "
+                           "mtime REAL, entity_type TEXT, query TEXT, n_rows INTEGER)")
+        connection.execute("CREATE INDEX IF NOT EXISTS cache_files_atime ON cache_files (atime)")
+        if new_manifest:
+            # files cached before the manifest existed
+            for file in os.listdir(config.project_data_folder_path):
+                if file.endswith((".parquet", ".arrow")):
+                    stat = os.stat(join(config.project_data_folder_path, file))
+                    connection.execute("INSERT OR REPLACE INTO cache_files VALUES (?, ?, ?, ?, ?, NULL, NULL)",
+                                       (file, get_dataset_size(join(config.project_data_folder_path, file)),
+                                        stat.st_atime, stat.st_mtime, file.split("_")[0]))
+    return connection
+
+
+def add_file_to_cache_manifest(file_path: str, entity_type: str | None, query: str | None, n_rows: int | None):
+    """
+    Adds (or updates) a file in the cache manifest.
+
+    :param file_path: The path of the cached file.
+    :type file_path: str
+    :param entity_type: The entity type of the dataset (e.g. "works").
+    :type entity_type: str | None
+    :param query: The API query of the dataset.
+    :type query: str | None
+    :param n_rows: The number of rows of the dataset.
+    :type n_rows: int | None
+    """
+    stat = os.stat(file_path)
+    with cache_manifest_lock:
+        connection = connect_cache_manifest()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO cache_files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (os.path.basename(file_path), get_dataset_size(file_path), time(), stat.st_mtime,
+                                entity_type, query, n_rows))
+        connection.close()
+
+
+def touch_file_in_cache_manifest(file_path: str):
+    """
+    Updates the last access time of a file in the cache manifest (used for the LRU eviction).
+
+    :param file_path: The path of the cached file.
+    :type file_path: str
+    """
+    if not is_in_cache_folder(file_path):
+        return
+    with cache_manifest_lock:
+        connection = connect_cache_manifest()
+        with connection:
+            connection.execute("UPDATE cache_files SET atime = ? WHERE file = ?", (time(), os.path.basename(file_path)))
+        connection.close()
+
+
+def remove_file_from_cache_manifest(file_path: str):
+    """
+    Removes a file from the cache manifest.
+
+    :param file_path: The path of the cached file.
+    :type file_path: str
+    """
+    if not is_in_cache_folder(file_path):
+        return
+    with cache_manifest_lock:
+        connection = connect_cache_manifest()
+        with connection:
+            connection.execute("DELETE FROM cache_files WHERE file = ?", (os.path.basename(file_path),))
+        connection.close()
+
+
+def get_cached_files(entity_type: str | None = None) -> dict[str, float]:
+    """
+    Gets the cached files listed in the cache manifest.
+
+    :param entity_type: Only get the files of this entity type (e.g. "works"). The default value is None to get all
+        the files.
+    :type entity_type: str | None
+    :return: The file names with their modification time.
+    :rtype: dict[str, float]
+    """
+    with cache_manifest_lock:
+        connection = connect_cache_manifest()
+        if entity_type is None:
+            rows = connection.execute("SELECT file, mtime FROM cache_files").fetchall()
+        else:
+            rows = connection.execute("SELECT file, mtime FROM cache_files WHERE entity_type = ?",
+                                      (entity_type,)).fetchall()
+        connection.close()
+    return dict(rows)
+
+
+def get_filter_key_and_value(query_filter: dict) -> tuple[str, object]:
+    """
+    Gets the key (e.g. "institutions.id") and the value of a query filter on one field (e.g.
+    {'institutions': {'id': 'I138595864'}}).
+
+    :param query_filter: The query filter.
+    :type query_filter: dict
+    :return: The key and the value of the filter, or (None, None) if the filter isn't on exactly one field.
+    :rtype: tuple[str, object]
+    """
+    keys = []
+    while isinstance(query_filter, dict):
+        if len(query_filter) != 1:
+            return None, None
+        key, query_filter = next(iter(query_filter.items()))
+        keys.append(key)
+    return ".".join(keys), query_filter
+
+
+def get_filter_from_key_and_value(filter_key: str, value) -> dict:
+    """
+    Gets the query filter from its key and value, the reverse of get_filter_key_and_value().
+
+    :param filter_key: The key of the filter (e.g. "institutions.id").
+    :type filter_key: str
+    :param value: The value of the filter.
+    :type value: object
+    :return: The query filter (e.g. {'institutions': {'id': value}}).
+    :rtype: dict
+    """
+    for key in reversed(filter_key.split(".")):
+        value = {key: value}
+    return value
+
+
+def get_nested_field_values(table: pa.Table, field_path: list[str]) -> tuple[pa.Array, pa.Array]:
+    """
+    Gets the values of a nested field of a table (e.g. ['authorships', 'institutions', 'id']), the lists on the path
+    being flattened, with the index of the row of each value.
+
+    :param table: The table.
+    :type table: pa.Table
+    :param field_path: The path of the field: the column followed by the names of the nested fields.
+    :type field_path: list[str]
+    :return: The index of the row of each value, and the values.
+    :rtype: tuple[pa.Array, pa.Array]
+    """
+    if field_path[0] not in table.column_names:
+        return pa.array([], pa.int64()), pa.array([], pa.string())
+    column = table.select([field_path[0]])
+    # the kernels don't handle nested null types (fields without any value)
+    values = conform_table_to_schema(column, get_schema_without_null_types(column.schema))[0].combine_chunks()
+    rows_index = pa.array(np.arange(len(values), dtype=np.int64))
+    for field in field_path[1:] + [None]:
+        if pa.types.is_list(values.type):
+            rows_index = pc.take(rows_index, pc.list_parent_indices(values))
+            values = pc.list_flatten(values)
+        if field is not None:
+            values = pc.struct_field(values, field)
+    return rows_index, values
+
+
+def conform_table_to_schema(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """
+    Conforms an Arrow table to a schema: the missing columns are added with null values, and the columns are ordered
+    and promoted to the types of the schema (e.g. null columns or structs with missing fields).
+
+    :param table: The Arrow table.
+    :type table: pa.Table
+    :param schema: The schema to conform to (it must be a superset of the table schema).
+    :type schema: pa.Schema
+    :return: The table conformed to the schema.
+    :rtype: pa.Table
+    """
+    # concatenating with an empty table promotes the types, which is more robust than a cast for nested null types
+    table = pa.concat_tables([schema.empty_table(), table.replace_schema_metadata()], promote_options="permissive")
+    table = table.select(schema.names)
+    return table if table.schema.equals(schema) else table.cast(schema)
+
+
+def convert_values_to_arrow_array(values: list, data_type: pa.DataType | None = None) -> pa.Array:
+    """
+    Converts the values of a column of entities into an Arrow array. The type of the array is the type given, extended
+    with the nested fields of the values which are not in it (e.g. a field added to the API), or the inferred type if
+    no type is given. If the values don't match the type given (e.g. the type of a field changed in the API), the
+    inferred type is used with a warning.
+
+    :param values: The values (Python objects, None for null values).
+    :type values: list
+    :param data_type: The expected type of the values, None to infer it.
+    :type data_type: pa.DataType | None
+    :return: The array.
+    :rtype: pa.Array
+    """
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # values with mixed types (e.g. ints and floats in nested lists) can't be inferred but can be converted
+        if data_type is None:
+            raise
+        return pa.array(values, data_type)
+    if data_type is None or array.type == data_type:
+        return array
+    try:
+        data_type = pa.unify_schemas([pa.schema([pa.field('values', data_type)]),
+                                      pa.schema([pa.field('values', array.type)])],
+                                     promote_options="permissive").field('values').type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        warnings.warn(f"The values of type {array.type} don't match the expected type {data_type}, the inferred type "
+                      f"is kept")
+        return array
+    return conform_table_to_schema(pa.table({'values': array}),
+                                   pa.schema([pa.field('values', data_type)]))['values'].combine_chunks()
+
+
+def convert_inverted_indexes_to_arrow_array(inverted_indexes: list) -> pa.Array:
+    """
+    Converts abstract inverted indexes (dictionaries with the words as keys and their positions as values, e.g.
+    {"Hello": [0], "world": [1]}) into a compact Arrow array of lists of (word, positions) structs. The conversion is
+    done by Arrow, the abstracts aren't rebuilt (see get_abstracts_from_inverted_indexes()).
+
+    :param inverted_indexes: The inverted indexes (None for the works without abstract).
+    :type inverted_indexes: list[dict | None]
+    :return: The inverted indexes.
+    :rtype: pa.Array
+    """
+    maps = pa.array(inverted_indexes, pa.map_(pa.string(), pa.list_(pa.int32())))
+    # the map kernels of Arrow are limited, the same data as a list of structs can be flattened
+    return pa.ListArray.from_arrays(maps.offsets, pa.StructArray.from_arrays([maps.keys, maps.items],
+                                                                             names=['word', 'positions']),
+                                    mask=maps.is_null())
+
+
+def get_abstracts_from_inverted_indexes(inverted_indexes: pa.Array | pa.ChunkedArray) -> pa.Array:
+    """
+    Rebuilds the abstracts from their inverted indexes (see convert_inverted_indexes_to_arrow_array()), for all the
+    works at once with Arrow kernels: the words are sorted by work and position, and joined by work.
+
+    :param inverted_indexes: The inverted indexes.
+    :type inverted_indexes: pa.Array | pa.ChunkedArray
+    :return: The abstracts (null for the works without inverted index).
+    :rtype: pa.Array
+    """
+    if isinstance(inverted_indexes, pa.ChunkedArray):
+        inverted_indexes = inverted_indexes.combine_chunks()
+    words = pc.list_flatten(inverted_indexes)
+    words_works_index = pc.list_parent_indices(inverted_indexes)
+    positions_lists = pc.struct_field(words, 'positions')
+    # one row per occurrence of a word
+    positions = pc.list_flatten(positions_lists)
+    occurrences_words_index = pc.list_parent_indices(positions_lists)
+    occurrences_works_index = pc.take(words_works_index, occurrences_words_index)
+    occurrences_order = pc.sort_indices(pa.table({'work': occurrences_works_index, 'position': positions}),
+                                        sort_keys=[('work', 'ascending'), ('position', 'ascending')])
+    occurrences_words = pc.take(pc.struct_field(words, 'word'), pc.take(occurrences_words_index, occurrences_order))
+    n_occurrences_per_work = np.bincount(occurrences_works_index.to_numpy(zero_copy_only=False).astype(np.int64),
+                                         minlength=len(inverted_indexes))
+    offsets = pa.array(np.concatenate([[0], np.cumsum(n_occurrences_per_work)]), pa.int64())
+    return pc.binary_join(pa.LargeListArray.from_arrays(offsets, occurrences_words, mask=inverted_indexes.is_null()),
+                          " ")
+
+
+def add_abstracts_to_table(works_table: pa.Table) -> pa.Table:
+    """
+    Replaces the column abstract_inverted_index of a table of works (if any) by the column abstract, rebuilt with
+    get_abstracts_from_inverted_indexes(). If the table also has an abstract column (e.g. a dataset written by an
+    older version and refreshed), the abstracts are merged.
+
+    :param works_table: The works.
+    :type works_table: pa.Table
+    :return: The works with the abstracts.
+    :rtype: pa.Table
+    """
+    if 'abstract_inverted_index' not in works_table.column_names:
+        return works_table
+    abstracts = get_abstracts_from_inverted_indexes(works_table['abstract_inverted_index']).cast(pa.string())
+    column_index = works_table.column_names.index('abstract_inverted_index')
+    if 'abstract' in works_table.column_names:
+        abstracts = pc.coalesce(works_table['abstract'].cast(pa.string()), abstracts)
+        works_table = works_table.drop_columns(['abstract'])
+        column_index = works_table.column_names.index('abstract_inverted_index')
+    return works_table.set_column(column_index, 'abstract', abstracts)
+
+
+def get_schema_without_null_types(schema: pa.Schema) -> pa.Schema:
+    """
+    Replaces the null types (fields without any value in the dataset), also in nested types, by the string type in a
+    schema. The pyarrow kernels used by the ArrowDtype columns (e.g. to explode a list of structs) don't handle nested
+    null types correctly.
+
+    :param schema: The schema.
+    :type schema: pa.Schema
+    :return: The schema without null types.
+    :rtype: pa.Schema
+    """
+    def replace_null_type(data_type: pa.DataType) -> pa.DataType:
+        if pa.types.is_null(data_type):
+            return pa.string()
+        if pa.types.is_list(data_type):
+            return pa.list_(replace_null_type(data_type.value_type))
+        if pa.types.is_struct(data_type):
+            return pa.struct([field.with_type(replace_null_type(field.type)) for field in data_type])
+        return data_type
+
+    return pa.schema([field.with_type(replace_null_type(field.type)) for field in schema], metadata=schema.metadata)
+
+
+def is_arrow_dataset(file_path: str) -> bool:
+    """
+    Checks if a cached dataset is stored in an Arrow IPC file (see config.cache_format) rather than in parquet.
+
+    :param file_path: The path of the dataset.
+    :type file_path: str
+    :return: True if the dataset is an Arrow IPC file.
+    :rtype: bool
+    """
+    return file_path.endswith(".arrow")
+
+
+def get_dataset_schema(file_path: str) -> pa.Schema:
+    """
+    Gets the schema of a cached dataset. The schema of a partitioned dataset (folder) is stored in its _common_metadata
+    file.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :return: The schema, with the metadata of the dataset.
+    :rtype: pa.Schema
+    """
+    if is_arrow_dataset(file_path):
+        with pa.memory_map(file_path) as source:
+            return pa.ipc.open_file(source).schema
+    return pq.read_schema(join(file_path, "_common_metadata") if isdir(file_path) else file_path)
+
+
+def get_dataset_read_options(file_path: str) -> dict:
+    """
+    Gets the options to give to pq.read_table() or pd.read_parquet() to read a cached dataset. A partitioned dataset is
+    read with its full schema, so the partition column keeps its type and position.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :return: The reading options.
+    :rtype: dict
+    """
+    if not isdir(file_path):
+        return {}
+    return {'schema': get_dataset_schema(file_path), 'partitioning': "hive"}
+
+
+def get_dataset_n_rows(file_path: str) -> int:
+    """
+    Gets the number of rows of a cached dataset, from the parquet metadata.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :return: The number of rows.
+    :rtype: int
+    """
+    if is_arrow_dataset(file_path):
+        with pa.memory_map(file_path) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    if not isdir(file_path):
+        return pq.read_metadata(file_path).num_rows
+    return ds.dataset(file_path, format="parquet", **get_dataset_read_options(file_path)).count_rows()
+
+
+def get_dataset_size(file_path: str) -> int:
+    """
+    Gets the size on disk of a cached dataset.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :return: The size in bytes.
+    :rtype: int
+    """
+    def get_folder_size(folder_path: str) -> int:
+        return sum(os.stat(join(folder, file)).st_size for folder, _, files in os.walk(folder_path) for file in files)
+
+    size = get_folder_size(file_path) if isdir(file_path) else os.stat(file_path).st_size
+    # the edge tables are removed with the dataset
+    return size + get_folder_size(get_edge_tables_folder_path(file_path))
+
+
+def remove_dataset(file_path: str):
+    """
+    Removes a cached dataset (parquet file or partitioned dataset folder) and its edge tables.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    """
+    if isdir(file_path):
+        shutil.rmtree(file_path)
+    else:
+        os.remove(file_path)
+    if isdir(get_edge_tables_folder_path(file_path)):
+        shutil.rmtree(get_edge_tables_folder_path(file_path))
+
+
+def replace_dataset(source_path: str, file_path: str):
+    """
+    Replaces a cached dataset by a new one (e.g. written in a temporary file). A parquet file can replace a partitioned
+    dataset folder and vice versa.
+
+    :param source_path: The path of the new dataset.
+    :type source_path: str
+    :param file_path: The path of the dataset to replace.
+    :type file_path: str
+    """
+    if isdir(file_path) or (isdir(source_path) and exists(file_path)):
+        remove_dataset(file_path)
+    os.replace(source_path, file_path)
+
+
+def intern_openalex_ids(ids: pa.Array | pa.ChunkedArray) -> pa.Array:
+    """
+    Interns OpenAlex ids (e.g. "https://openalex.org/W2741809807" or "W2741809807") in int64 (e.g. 2741809807), the
+    type tag (e.g. "W") being known from the context (e.g. the column). A list array (e.g. referenced_works) is
+    interned in a list<int64> array. The interned ids use much less memory than the strings and are faster to count.
+    Use get_openalex_ids_from_interned() to get the strings back.
+
+    :param ids: The ids (string array or list of strings array).
+    :type ids: pa.Array | pa.ChunkedArray
+    :return: The interned ids.
+    :rtype: pa.Array
+    """
+    if isinstance(ids, pa.ChunkedArray):
+        ids = ids.combine_chunks()
+    if pa.types.is_list(ids.type):
+        return pa.ListArray.from_arrays(ids.offsets, intern_openalex_ids(ids.values), mask=ids.is_null())
+    if pa.types.is_null(ids.type):
+        return pa.nulls(len(ids), pa.int64())
+    return pc.replace_substring_regex(ids, r"^(https://openalex\.org/)?[A-Za-z]", "").cast(pa.int64())
+
+
+def get_openalex_ids_from_interned(ids, type_tag: str) -> pa.Array:
+    """
+    Gets the OpenAlex ids (e.g. "https://openalex.org/W2741809807") from interned ids (see intern_openalex_ids()).
+
+    :param ids: The interned ids (anything which can be converted to an Arrow array, e.g. a pandas Index).
+    :type ids: pa.Array | pd.Index | pd.Series | list[int]
+    :param type_tag: The type tag of the ids (e.g. "W" for works).
+    :type type_tag: str
+    :return: The ids.
+    :rtype: pa.Array
+    """
+    ids = ids if isinstance(ids, (pa.Array, pa.ChunkedArray)) else pa.array(ids, pa.int64())
+    return pc.binary_join_element_wise("https://openalex.org/" + type_tag, ids.cast(pa.string()), "")
+
+
+def get_edge_tables_folder_path(file_path: str) -> str:
+    """
+    Gets the path of the folder containing the edge tables of a cached dataset (see config.write_edge_tables) and its
+    yearly usage indexes.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :return: The path of the edge tables folder.
+    :rtype: str
+    """
+    return file_path + ".edges"
+
+
+def read_edge_table(file_path: str, name: str) -> pa.Table | None:
+    """
+    Reads an edge table of a cached dataset (see config.write_edge_tables).
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :param name: The name of the edge table (e.g. "references").
+    :type name: str
+    :return: The edge table, or None if it doesn't exist or if it is older than the dataset (the dataset was written
+        again without its edge tables).
+    :rtype: pa.Table | None
+    """
+    edge_table_path = join(get_edge_tables_folder_path(file_path), name + ".parquet")
+    if not isfile(edge_table_path) or not exists(file_path) or \
+            os.stat(edge_table_path).st_mtime < os.stat(file_path).st_mtime:
+        return None
+    edge_table = pq.read_table(edge_table_path)
+    # the ids of edge tables written by older versions are strings
+    for i, field in enumerate(edge_table.schema):
+        if field.name.endswith("_id") and pa.types.is_string(field.type):
+            edge_table = edge_table.set_column(i, field.name, intern_openalex_ids(edge_table[field.name]))
+    return edge_table
+
+
+def get_yearly_usage_index_path(file_path: str, element_type: str) -> str:
+    """
+    Gets the path of a yearly usage index of a cached dataset, stored with its edge tables.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :param element_type: The element type of the index (e.g. "concept").
+    :type element_type: str
+    :return: The path of the yearly usage index.
+    :rtype: str
+    """
+    return join(get_edge_tables_folder_path(file_path), "yearly_usage_" + element_type + ".parquet")
+
+
+def read_yearly_usage_index(file_path: str, element_type: str) -> pa.Table | None:
+    """
+    Reads a yearly usage index (number of uses of each element per year) of a cached dataset.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :param element_type: The element type of the index (e.g. "concept").
+    :type element_type: str
+    :return: The yearly usage index, or None if it doesn't exist or if it is older than the dataset.
+    :rtype: pa.Table | None
+    """
+    index_path = get_yearly_usage_index_path(file_path, element_type)
+    if not isfile(index_path) or not exists(file_path) or os.stat(index_path).st_mtime < os.stat(file_path).st_mtime:
+        return None
+    return pq.read_table(index_path)
+
+
+def write_yearly_usage_index(file_path: str, element_type: str, index: pa.Table):
+    """
+    Writes a yearly usage index of a cached dataset, next to its edge tables (it is removed with the dataset).
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :param element_type: The element type of the index (e.g. "concept").
+    :type element_type: str
+    :param index: The yearly usage index.
+    :type index: pa.Table
+    """
+    index_path = get_yearly_usage_index_path(file_path, element_type)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    # written in a temporary file, so a process reading the index never reads a partial file
+    pq.write_table(index, index_path + f".{os.getpid()}.tmp", compression=config.parquet_compression)
+    os.replace(index_path + f".{os.getpid()}.tmp", index_path)
+
+
+def get_dataset_metadata(file_path: str) -> dict[str, str]:
+    """
+    Gets the openalex-analysis metadata of a cached dataset, stored in the metadata of the parquet file (e.g.
+    last_sync_date, the date of the last synchronisation with the OpenAlex API, or api_order, "true" if the rows are in
+    the order returned by the API).
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :return: The metadata.
+    :rtype: dict[str, str]
+    """
+    metadata = get_dataset_schema(file_path).metadata or {}
+    return {key.decode().removeprefix("openalex_analysis."): val.decode() for key, val in metadata.items()
+            if key.startswith(b"openalex_analysis.")}
+
+
+def get_last_sync_date(file_path: str) -> str | None:
+    """
+    Gets the date of the last synchronisation with the OpenAlex API of a cached dataset, stored in the metadata of the
+    parquet file.
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :return: The date (ISO format) of the last synchronisation, or None if the file doesn't have one.
+    :rtype: str | None
+    """
+    return get_dataset_metadata(file_path).get("last_sync_date")
+
+
+def get_dataset_columns(file_path: str) -> list[str] | None:
+    """
+    Gets the columns downloaded in a cached dataset, stored in the metadata of the dataset when only some columns were
+    downloaded (see config.download_only_loaded_columns).
+
+    :param file_path: The path of the dataset (file or partitioned dataset folder).
+    :type file_path: str
+    :return: The columns, or None if all the columns were downloaded.
+    :rtype: list[str] | None
+    """
+    columns = get_dataset_metadata(file_path).get("columns")
+    return json.loads(columns) if columns is not None else None
+
+
+def add_dataset_metadata_to_schema(schema: pa.Schema, dataset_metadata: dict[str, str] | None) -> pa.Schema:
+    """
+    Adds the openalex-analysis metadata of a dataset to an Arrow schema.
+
+    :param schema: The Arrow schema.
+    :type schema: pa.Schema
+    :param dataset_metadata: The metadata (see get_dataset_metadata()).
+    :type dataset_metadata: dict[str, str] | None
+    :return: The schema with the metadata.
+    :rtype: pa.Schema
+    """
+    if not dataset_metadata:
+        return schema
+    return schema.with_metadata((schema.metadata or {}) | {("openalex_analysis." + key).encode(): val.encode()
+                                                           for key, val in dataset_metadata.items()})
+
+
+def write_parquet_dataset(table: pa.Table, file_path: str, dataset_metadata: dict[str, str] | None = None,
+                          partition_key: str | None = None):
+    """
+    Writes a dataset in a compressed parquet file with the openalex-analysis metadata (e.g. the date of the
+    synchronisation with the OpenAlex API). The file is written in a temporary file and then renamed, so an
+    interrupted write doesn't leave a truncated cache file.
+
+    :param table: The dataset.
+    :type table: pa.Table
+    :param file_path: The path of the parquet file (or of the Arrow IPC file if it ends with .arrow).
+    :type file_path: str
+    :param dataset_metadata: The metadata (see get_dataset_metadata()). The default value is None.
+    :type dataset_metadata: dict[str, str] | None
+    :param partition_key: If provided (and in the columns of the dataset), the dataset is written as a hive-partitioned
+        parquet dataset (a folder) partitioned by this column. The default value is None.
+    :type partition_key: str | None
+    """
+    table = table.replace_schema_metadata(add_dataset_metadata_to_schema(table.schema, dataset_metadata).metadata)
+    if is_arrow_dataset(file_path):
+        table = conform_table_to_schema(table, get_schema_without_null_types(table.schema))
+        with pa.OSFile(file_path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif partition_key is not None and partition_key in table.column_names:
+        write_partitioned_dataset(table.to_batches(), table.schema, file_path + ".tmp", partition_key)
+    else:
+        pq.write_table(table, file_path + ".tmp", compression=config.parquet_compression)
+    replace_dataset(file_path + ".tmp", file_path)
+
+
+def write_partitioned_dataset(batches, schema: pa.Schema, folder_path: str, partition_key: str):
+    """
+    Writes record batches in a compressed hive-partitioned parquet dataset, with the schema (and the metadata) of the
+    dataset in a _common_metadata file.
+
+    :param batches: The record batches.
+    :type batches: Iterable[pa.RecordBatch]
+    :param schema: The schema of the record batches.
+    :type schema: pa.Schema
+    :param folder_path: The path of the dataset folder.
+    :type folder_path: str
+    :param partition_key: The column used to partition the dataset.
+    :type partition_key: str
+    """
+    if isdir(folder_path):
+        shutil.rmtree(folder_path)
+    # the folder is also needed if there is no row to write
+    os.makedirs(folder_path)
+    ds.write_dataset(batches, folder_path, schema=schema, format="parquet",
+                     partitioning=ds.partitioning(pa.schema([schema.field(partition_key)]), flavor="hive"),
+                     file_options=ds.ParquetFileFormat().make_write_options(compression=config.parquet_compression),
+                     existing_data_behavior="overwrite_or_ignore")
+    pq.write_metadata(schema, join(folder_path, "_common_metadata"))
+
+
+def merge_parquet_segments(segments_folder_path: str, file_path: str, dataset_metadata: dict[str, str] | None = None,
+                           partition_key: str | None = None):
+    """
+    Merges the parquet segments of a folder into a single parquet file, with one row group per segment, and removes
+    the folder. The segments are read one by one, so only one segment is loaded in memory at a time. As the schema
+    can change between segments (e.g. a field only present in some entities), the schemas are unified first.
+
+    :param segments_folder_path: The folder containing the parquet segments.
+    :type segments_folder_path: str
+    :param file_path: The path of the parquet file (or of the Arrow IPC file if it ends with .arrow) to create.
+    :type file_path: str
+    :param dataset_metadata: The metadata stored in the file (see get_dataset_metadata()). The default value is None.
+    :type dataset_metadata: dict[str, str] | None
+    :param partition_key: If provided (and in the columns of the segments), the segments are merged in a
+        hive-partitioned parquet dataset (a folder) partitioned by this column. The default value is None.
+    :type partition_key: str | None
+    """
+    segments_paths = sorted(join(segments_folder_path, file) for file in os.listdir(segments_folder_path)
+                            if file.endswith(".parquet")) if isdir(segments_folder_path) else []
+    if not segments_paths:
+        # nothing was downloaded, save an empty dataset like the in memory download does
+        write_parquet_dataset(pa.Table.from_pandas(pd.DataFrame()), file_path, dataset_metadata)
+    else:
+        schema = pa.unify_schemas([pq.read_schema(path).remove_metadata() for path in segments_paths],
+                                  promote_options="permissive")
+        schema = add_dataset_metadata_to_schema(schema, dataset_metadata)
+        # write in a temporary file and rename it, so an interrupted merge doesn't leave a truncated cache file
+        if is_arrow_dataset(file_path):
+            schema = get_schema_without_null_types(schema)
+            with pa.OSFile(file_path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+                for path in segments_paths:
+                    writer.write_table(conform_table_to_schema(pq.read_table(path), schema))
+        elif partition_key is not None and partition_key in schema.names:
+            batches = (batch for path in segments_paths
+                       for batch in conform_table_to_schema(pq.read_table(path), schema).to_batches())
+            write_partitioned_dataset(batches, schema, file_path + ".tmp", partition_key)
+        else:
+            with pq.ParquetWriter(file_path + ".tmp", schema, compression=config.parquet_compression) as writer:
+                for path in segments_paths:
+                    writer.write_table(conform_table_to_schema(pq.read_table(path), schema))
+        replace_dataset(file_path + ".tmp", file_path)
+    if isdir(segments_folder_path):
+        shutil.rmtree(segments_folder_path)
+
+
+def read_dataset_table(file_path: str, columns: list[str] | None = None, filters: list | None = None,
+                       n_rows: int | None = None) -> pa.Table:
+    """
+    Reads a cached dataset (parquet file, partitioned parquet dataset or Arrow IPC file) in an Arrow table. An Arrow
+    IPC file is memory-mapped, so its columns are read without copy. If n_rows is provided, only the row groups (or
+    record batches) containing the first rows are read.
+
+    :param file_path: The path of the dataset.
+    :type file_path: str
+    :param columns: The columns to read. The default value is None to read all the columns.
+    :type columns: list[str] | None
+    :param filters: Only read the rows matching these filters (pyarrow filters format). The default value is None.
+    :type filters: list | None
+    :param n_rows: Only read the first rows (the filters are applied on these rows). The default value is None to read
+        all the rows.
+    :type n_rows: int | None
+    :return: The dataset.
+    :rtype: pa.Table
+    """
+    if is_arrow_dataset(file_path):
+        # the buffers of the table keep the mapped memory alive after the file is closed
+        with pa.memory_map(file_path) as source:
+            reader = pa.ipc.open_file(source)
+            if n_rows is None:
+                table = reader.read_all()
+            else:
+                batches = []
+                for i in range(reader.num_record_batches):
+                    if sum(batch.num_rows for batch in batches) >= n_rows:
+                        break
+                    batches.append(reader.get_batch(i))
+                table = pa.Table.from_batches(batches, reader.schema).slice(0, n_rows)
+    elif n_rows is not None:
+        parquet_file = pq.ParquetFile(file_path)
+        row_groups = []
+        n_rows_in_row_groups = 0
+        for i in range(parquet_file.num_row_groups):
+            if n_rows_in_row_groups >= n_rows:
+                break
+            row_groups.append(i)
+            n_rows_in_row_groups += parquet_file.metadata.row_group(i).num_rows
+        # the filters can use columns which aren't loaded
+        table = parquet_file.read_row_groups(row_groups, columns=None if filters else columns).slice(0, n_rows)
+    else:
+        return pq.read_table(file_path, columns=columns, filters=filters, **get_dataset_read_options(file_path))
+    if filters:
+        table = table.filter(pq.filters_to_expression(filters))
+    return table.select(columns) if columns is not None else table
+
+
 def get_entity_type_from_id(entity: str) -> pyalex.api.BaseOpenAlex:
     """
      Gets the entity type from the entity id string.
@@ -589,17 +2471,246 @@ def get_entity_type_from_id(entity: str) -> pyalex.api.BaseOpenAlex:
             raise ValueError("Entity id " + entity + " not valid")
 
 
+# in memory LRU cache of the entities metadata, on top of the SQLite cache on disk
+entities_metadata_memory_cache = OrderedDict()
+entities_metadata_cache_lock = threading.Lock()
+
+
+def get_entities_metadata_cache_path() -> str:
+    """
+    Gets the path of the SQLite database used to cache the entities metadata.
+
+    :return: The path of the SQLite database.
+    :rtype: str
+    """
+    return join(config.project_data_folder_path, "entities_metadata_cache.sqlite")
+
+
+def connect_entities_metadata_cache() -> sqlite3.Connection:
+    """
+    Connects to the SQLite database used to cache the entities metadata (and create it if needed).
+
+    :return: The connection to the database.
+    :rtype: sqlite3.Connection
+    """
+    os.makedirs(config.project_data_folder_path, exist_ok=True)
+    connection = sqlite3.connect(get_entities_metadata_cache_path(), timeout=30)
+    connection.execute("CREATE TABLE IF NOT EXISTS entities (id TEXT PRIMARY KEY, data TEXT, download_time REAL)")
+    # ids checked with check_if_entities_exist() which don't exist in OpenAlex
+    connection.execute("CREATE TABLE IF NOT EXISTS missing_entities (id TEXT PRIMARY KEY, check_time REAL)")
+    return connection
+
+
+def add_entities_to_metadata_cache(entities: list[dict]):
+    """
+    Adds entities (as downloaded from the API) to the entities metadata cache, in memory and on disk.
+
+    :param entities: The entities (PyAlex objects).
+    :type entities: list[dict]
+    """
+    rows = [(entity['id'].removeprefix("https://openalex.org/"), json.dumps(entity), time()) for entity in entities]
+    with entities_metadata_cache_lock:
+        for entity_id, data, download_time in rows:
+            entities_metadata_memory_cache[entity_id] = (json.loads(data), download_time)
+            entities_metadata_memory_cache.move_to_end(entity_id)
+        while len(entities_metadata_memory_cache) > config.metadata_cache_size:
+            entities_metadata_memory_cache.popitem(last=False)
+        connection = connect_entities_metadata_cache()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO entities VALUES (?, ?, ?)", rows)
+        connection.close()
+
+
+def get_entities_from_metadata_cache(entities: list[str]) -> dict[str, dict]:
+    """
+    Gets the entities which are in the entities metadata cache and not older than config.cache_max_age days.
+
+    :param entities: The entity ids.
+    :type entities: list[str]
+    :return: The cached entities with their id as key.
+    :rtype: dict[str, dict]
+    """
+    min_download_time = time() - config.cache_max_age * 86400
+    res = {}
+    with entities_metadata_cache_lock:
+        for entity in entities:
+            cached = entities_metadata_memory_cache.get(entity)
+            if cached is not None and cached[1] > min_download_time:
+                entities_metadata_memory_cache.move_to_end(entity)
+                res[entity] = cached[0]
+        missing = [entity for entity in entities if entity not in res]
+        if missing and isfile(get_entities_metadata_cache_path()):
+            connection = connect_entities_metadata_cache()
+            # SQLite limits the number of variables in a query
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i+500]
+                rows = connection.execute(
+                    f"SELECT id, data, download_time FROM entities WHERE id IN ({','.join('?' * len(batch))}) "
+                    f"AND download_time > ?", batch + [min_download_time]).fetchall()
+                for entity_id, data, download_time in rows:
+                    res[entity_id] = json.loads(data)
+                    entities_metadata_memory_cache[entity_id] = (res[entity_id], download_time)
+            connection.close()
+            while len(entities_metadata_memory_cache) > config.metadata_cache_size:
+                entities_metadata_memory_cache.popitem(last=False)
+    return res
+
+
+aggregates_cache_lock = threading.Lock()
+
+
+def get_aggregates_cache_path() -> str:
+    """
+    Gets the path of the SQLite database used to cache the aggregates (group_by responses) of the API.
+
+    :return: The path of the SQLite database.
+    :rtype: str
+    """
+    return join(config.project_data_folder_path, "aggregates_cache.sqlite")
+
+
+def connect_aggregates_cache() -> sqlite3.Connection:
+    """
+    Connects to the SQLite database used to cache the aggregates (and create it if needed).
+
+    :return: The connection to the database.
+    :rtype: sqlite3.Connection
+    """
+    os.makedirs(config.project_data_folder_path, exist_ok=True)
+    connection = sqlite3.connect(get_aggregates_cache_path(), timeout=30)
+    connection.execute("CREATE TABLE IF NOT EXISTS aggregates (query TEXT PRIMARY KEY, data TEXT, download_time REAL)")
+    return connection
+
+
+def add_aggregate_to_cache(query_key: str, groups_count: dict[str, int]):
+    """
+    Adds an aggregate to the aggregates cache.
+
+    :param query_key: The key of the aggregate query (entity type, query and group_by key).
+    :type query_key: str
+    :param groups_count: The count of each group.
+    :type groups_count: dict[str, int]
+    """
+    with aggregates_cache_lock:
+        connection = connect_aggregates_cache()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO aggregates VALUES (?, ?, ?)",
+                               (query_key, json.dumps(groups_count), time()))
+        connection.close()
+
+
+def get_aggregate_from_cache(query_key: str) -> dict[str, int] | None:
+    """
+    Gets an aggregate from the aggregates cache, if it isn't older than config.cache_max_age days.
+
+    :param query_key: The key of the aggregate query (entity type, query and group_by key).
+    :type query_key: str
+    :return: The count of each group, or None if the aggregate isn't cached.
+    :rtype: dict[str, int] | None
+    """
+    if not isfile(get_aggregates_cache_path()):
+        return None
+    with aggregates_cache_lock:
+        connection = connect_aggregates_cache()
+        row = connection.execute("SELECT data FROM aggregates WHERE query = ? AND download_time > ?",
+                                 (query_key, time() - config.cache_max_age * 86400)).fetchone()
+        connection.close()
+    return json.loads(row[0]) if row is not None else None
+
+
+def add_missing_entities_to_cache(entities: list[str]):
+    """
+    Adds entity ids which don't exist in OpenAlex to the negative cache (in the entities metadata cache database).
+
+    :param entities: The entity ids.
+    :type entities: list[str]
+    """
+    with entities_metadata_cache_lock:
+        connection = connect_entities_metadata_cache()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO missing_entities VALUES (?, ?)",
+                                   [(entity, time()) for entity in entities])
+        connection.close()
+
+
+def get_missing_entities_from_cache(entities: list[str]) -> set[str]:
+    """
+    Gets the entity ids which are known to not exist in OpenAlex, if they were checked less than
+    config.cache_max_age days ago.
+
+    :param entities: The entity ids.
+    :type entities: list[str]
+    :return: The entity ids known to be missing.
+    :rtype: set[str]
+    """
+    res = set()
+    if not isfile(get_entities_metadata_cache_path()):
+        return res
+    with entities_metadata_cache_lock:
+        connection = connect_entities_metadata_cache()
+        # SQLite limits the number of variables in a query
+        for i in range(0, len(entities), 500):
+            batch = entities[i:i+500]
+            rows = connection.execute(
+                f"SELECT id FROM missing_entities WHERE id IN ({','.join('?' * len(batch))}) AND check_time > ?",
+                batch + [time() - config.cache_max_age * 86400]).fetchall()
+            res.update(row[0] for row in rows)
+        connection.close()
+    return res
+
+
+def prefetch_entities_metadata(entities: list[str]):
+    """
+    Downloads the metadata of the entities which are not already cached, 100 by 100, and add them to the entities
+    metadata cache. It avoids one query per entity when the name or information of many entities is needed later.
+
+    :param entities: The entity ids.
+    :type entities: list[str]
+    """
+    entities = [entity.removeprefix("https://openalex.org/") for entity in dict.fromkeys(entities)]
+    cached = get_entities_from_metadata_cache(entities)
+    missing_per_type = {}
+    for entity in entities:
+        if entity not in cached:
+            missing_per_type.setdefault(get_entity_type_from_id(entity), []).append(entity)
+    for entity_type, missing in missing_per_type.items():
+        log_oa.info(f"Prefetching the metadata of {len(missing)} entities...")
+        for i in range(0, len(missing), 100):
+            add_entities_to_metadata_cache(
+                entity_type().filter(ids={'openalex': '|'.join(missing[i:i+100])}).get(per_page=100))
+
+
+def get_entity_metadata(entity: str) -> dict:
+    """
+    Gets an entity from the entities metadata cache, or from the API if it is not cached (or too old).
+
+    :param entity: The entity id.
+    :type entity: str
+    :return: The entity (PyAlex object).
+    :rtype: dict
+    """
+    entity = entity.removeprefix("https://openalex.org/")
+    entity_type = get_entity_type_from_id(entity)
+    res = get_entities_from_metadata_cache([entity]).get(entity)
+    if res is None:
+        # call the API
+        res = entity_type()[entity]
+        add_entities_to_metadata_cache([res])
+        return res
+    # use the PyAlex class of the entity (e.g. to get the abstract of works)
+    return getattr(entity_type, "resource_class", dict)(res)
+
+
 def get_name_of_entity(entity: str) -> str:
     """
-    Gets the name of the entity from the api.
+    Gets the name of the entity from the api (or the entities metadata cache).
 
     :param entity: The entity id.
     :type entity: str
     :return: The name of the entity.
     :rtype: str
     """
-    # call the API
-    e = get_entity_type_from_id(entity)()[entity]
+    e = get_entity_metadata(entity)
     return e['display_name']
 
 
@@ -640,7 +2751,8 @@ def get_info_about_entity(entity: str, infos: list[str] | None = None,
     """
     if infos is None:
         infos = ["display_name"]
-    e = get_entity_type_from_id(entity)()[entity]
+    # copy the entity to not modify the cached one
+    e = get_entity_metadata(entity).copy()
     if "author_citation_style" in infos:
         e["author_citation_style"] = extract_authorships_citation_style(e["authorships"])
     res = {key: val for key, val in e.items() if key in infos}
@@ -653,29 +2765,139 @@ def get_info_about_entity(entity: str, infos: list[str] | None = None,
 
 def check_if_entity_exists(entity: str) -> bool:
     """
-    Check if the entity exists.
-    TODO: check status code for existence of entity as other errors can occur.
+    Check if the entity exists (see check_if_entities_exist()).
 
     :param entity: The entity id.
     :type entity: str
     :return: True if the entity exists.
     :rtype: bool
     """
-    # get the name of the entity
-    api_path = str(entity).removeprefix("<class 'pyalex.api.").removesuffix("'>").lower() + "s"
-    # call the API
-    response = requests.get("https://api.openalex.org/" + api_path + "/" + entity)
-    if response.status_code == 404:
-        return False
-    else:
+    entity = entity.removeprefix("https://openalex.org/")
+    return check_if_entities_exist([entity])[entity]
+
+
+def check_if_entities_exist(entities: list[str]) -> dict[str, bool]:
+    """
+    Check if the entities exist. The entities in the entities metadata cache exist and the entities in the negative
+    cache (ids checked less than config.cache_max_age days ago) don't. The other ones are queried to the API 100 by
+    100 with the ids.openalex filter, in parallel with config.n_parallel_downloads threads. The ids not found in the
+    batches (e.g. the ids of merged entities, the API returns the entity they were merged into) are queried one by
+    one following the redirections, and the missing ones are added to the negative cache.
+
+    :param entities: The entity ids.
+    :type entities: list[str]
+    :return: True or False for each entity id (without the "https://openalex.org/" prefix).
+    :rtype: dict[str, bool]
+    """
+    entities = [entity.removeprefix("https://openalex.org/") for entity in dict.fromkeys(entities)]
+    # the ids are case-insensitive, they are checked upper-cased and returned as given
+    openalex_ids = {entity: entity.upper() for entity in entities}
+    ids = list(dict.fromkeys(openalex_ids.values()))
+    res = {entity: True for entity in get_entities_from_metadata_cache(ids)}
+    res.update({entity: False for entity in get_missing_entities_from_cache(
+        [entity for entity in ids if entity not in res])})
+    batches = []
+    unknown_per_type = {}
+    for entity in ids:
+        if entity not in res:
+            unknown_per_type.setdefault(get_entity_type_from_id(entity), []).append(entity)
+    for entity_type, unknown in unknown_per_type.items():
+        batches.extend((entity_type, unknown[i:i+100]) for i in range(0, len(unknown), 100))
+
+    def get_batch(batch: tuple[pyalex.api.BaseOpenAlex, list[str]]) -> list:
+        entity_query = batch[0]().filter(ids={'openalex': '|'.join(batch[1])}).select(['id'])
+        return entity_query.get(per_page=100)
+
+    def check_entity(entity_type: pyalex.api.BaseOpenAlex, entity: str) -> bool:
+        # the API redirects the merged entities to the entity they were merged into
+        try:
+            entity_type()[entity]
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return False
+            raise
         return True
 
+    if batches:
+        log_oa.info(f"Checking if {sum(len(batch[1]) for batch in batches)} entities exist...")
+        missing = []
+        with ThreadPoolExecutor(max_workers=config.n_parallel_downloads) as executor:
+            for batch, batch_res in zip(batches, executor.map(get_batch, batches)):
+                found = {entity['id'].removeprefix("https://openalex.org/") for entity in batch_res}
+                for entity in batch[1]:
+                    res[entity] = entity in found or check_entity(batch[0], entity)
+                    if not res[entity]:
+                        missing.append(entity)
+        if missing:
+            add_missing_entities_to_cache(missing)
+    return {entity: res[openalex_ids[entity]] for entity in entities}
+
+
+# Arrow types of the nested fields shared by the schemas of the entities (see EntitiesData.entities_schema)
+dehydrated_entity_type = pa.struct([('id', pa.string()), ('display_name', pa.string())])
+dehydrated_institution_type = pa.struct([
+    ('id', pa.string()), ('display_name', pa.string()), ('ror', pa.string()), ('country_code', pa.string()),
+    ('type', pa.string()), ('lineage', pa.list_(pa.string()))])
+dehydrated_concept_type = pa.struct([
+    ('id', pa.string()), ('wikidata', pa.string()), ('display_name', pa.string()), ('level', pa.int64()),
+    ('score', pa.float64())])
+topic_type = pa.struct([
+    ('id', pa.string()), ('display_name', pa.string()), ('count', pa.int64()), ('score', pa.float64()),
+    ('subfield', dehydrated_entity_type), ('field', dehydrated_entity_type), ('domain', dehydrated_entity_type)])
+counts_by_year_type = pa.list_(pa.struct([
+    ('year', pa.int64()), ('works_count', pa.int64()), ('cited_by_count', pa.int64())]))
+summary_stats_type = pa.struct([
+    ('2yr_mean_citedness', pa.float64()), ('h_index', pa.int64()), ('i10_index', pa.int64())])
+# fields common to all the entity types except works
+entities_common_fields = [
+    ('id', pa.string()), ('display_name', pa.string()), ('works_count', pa.int64()), ('cited_by_count', pa.int64()),
+    ('summary_stats', summary_stats_type), ('counts_by_year', counts_by_year_type), ('updated_date', pa.string()),
+    ('created_date', pa.string())]
+
 
 class WorksData(EntitiesData, Works):
     """
     This class contains specific methods for Works entity data.
     """
     EntityOpenAlex = Works
+    download_shard_key = "publication_year"
+    dataset_partition_key = "publication_year"
+    columns_api_fields = {'abstract': 'abstract_inverted_index'}
+    lazy_columns = {'abstract': 'abstract_inverted_index'}
+    entities_from_fields = {'institutions.id': ['authorships', 'institutions', 'id'],
+                            'author.id': ['authorships', 'author', 'id'],
+                            'concepts.id': ['concepts', 'id'],
+                            'topics.id': ['topics', 'id']}
+    edge_tables_columns = ['id', 'publication_year', 'referenced_works', 'authorships', 'concepts']
+    entities_schema = pa.schema([
+        ('id', pa.string()), ('doi', pa.string()), ('title', pa.string()), ('display_name', pa.string()),
+        ('publication_year', pa.int64()), ('publication_date', pa.string()), ('language', pa.string()),
+        ('type', pa.string()), ('type_crossref', pa.string()), ('cited_by_count', pa.int64()),
+        ('fwci', pa.float64()), ('is_retracted', pa.bool_()), ('is_paratext', pa.bool_()),
+        ('has_fulltext', pa.bool_()), ('countries_distinct_count', pa.int64()),
+        ('institutions_distinct_count', pa.int64()), ('locations_count', pa.int64()),
+        ('referenced_works_count', pa.int64()), ('referenced_works', pa.list_(pa.string())),
+        ('related_works', pa.list_(pa.string())), ('corresponding_author_ids', pa.list_(pa.string())),
+        ('corresponding_institution_ids', pa.list_(pa.string())), ('indexed_in', pa.list_(pa.string())),
+        ('open_access', pa.struct([('is_oa', pa.bool_()), ('oa_status', pa.string()), ('oa_url', pa.string()),
+                                   ('any_repository_has_fulltext', pa.bool_())])),
+        ('authorships', pa.list_(pa.struct([
+            ('author_position', pa.string()),
+            ('author', pa.struct([('id', pa.string()), ('display_name', pa.string()), ('orcid', pa.string())])),
+            ('institutions', pa.list_(dehydrated_institution_type)), ('countries', pa.list_(pa.string())),
+            ('is_corresponding', pa.bool_()), ('raw_author_name', pa.string()),
+            ('raw_affiliation_strings', pa.list_(pa.string()))]))),
+        ('biblio', pa.struct([('volume', pa.string()), ('issue', pa.string()), ('first_page', pa.string()),
+                              ('last_page', pa.string())])),
+        ('primary_topic', topic_type), ('topics', pa.list_(topic_type)),
+        ('keywords', pa.list_(pa.struct([('id', pa.string()), ('display_name', pa.string()),
+                                         ('score', pa.float64())]))),
+        ('concepts', pa.list_(dehydrated_concept_type)),
+        ('counts_by_year', pa.list_(pa.struct([('year', pa.int64()), ('cited_by_count', pa.int64())]))),
+        ('abstract', pa.string()), ('abstract_inverted_index', pa.list_(pa.struct([
+            ('word', pa.string()), ('positions', pa.list_(pa.int32()))]))),
+        ('cited_by_api_url', pa.string()), ('updated_date', pa.string()),
+        ('created_date', pa.string())])
 
     def filter_and_format_entity_data_from_api_response(self, entity: dict):
         """
@@ -686,10 +2908,124 @@ class WorksData(EntitiesData, Works):
         :rtype: dict
         """
 
-        # Store the abstract as a string (here, we avoid the key "abstract" as PyAlex redefined __getitem__() for it)
-        entity['extracted_abstract'] = entity['abstract']
-        # as we store the abstract as a string, we can delete its inverted index
-        del entity['abstract_inverted_index']
+        # the abstract is stored as its inverted index, and only rebuilt when the abstract column is loaded (see
+        # decode_lazy_columns())
+        if not config.download_abstracts and 'abstract_inverted_index' in entity:
+            del entity['abstract_inverted_index']
+
+    def convert_column_values_to_arrow_array(self, column: str, values: list) -> pa.Array:
+        """
+        Converts the values of a column of works into an Arrow array (see
+        EntitiesData.convert_column_values_to_arrow_array()). The abstract inverted indexes are converted into a compact
+        list of (word, positions).
+
+        :param column: The name of the column.
+        :type column: str
+        :param values: The values of the column.
+        :type values: list
+        :return: The array.
+        :rtype: pa.Array
+        """
+        if column == 'abstract_inverted_index':
+            return convert_inverted_indexes_to_arrow_array(values)
+        return super().convert_column_values_to_arrow_array(column, values)
+
+    def decode_lazy_columns(self, entities_table: pa.Table) -> pa.Table:
+        """
+        Rebuilds the abstracts of the works from their inverted indexes, in batch (see add_abstracts_to_table()).
+
+        :param entities_table: The works.
+        :type entities_table: pa.Table
+        :return: The works with the abstract column instead of the abstract_inverted_index column.
+        :rtype: pa.Table
+        """
+        return add_abstracts_to_table(entities_table)
+
+    def get_dataset_columns_needed(self) -> list[str] | None:
+        """
+        Gets the columns the dataset of the instance needs to have (see EntitiesData.get_dataset_columns_needed()),
+        without the abstract if config.download_abstracts is False.
+
+        :return: The columns, or None if all the columns are needed.
+        :rtype: list[str] | None
+        """
+        columns = super().get_dataset_columns_needed()
+        if columns is not None and not config.download_abstracts:
+            columns = [column for column in columns if column != 'abstract']
+        return columns
+
+    def extract_edge_tables(self, entities_table: pa.Table) -> dict[str, pa.Table]:
+        """
+        Extracts flat edge tables from the nested columns of a dataset of works (see config.write_edge_tables):
+
+        * **references** - work_id, publication_year, referenced_work_id
+        * **authorships** - work_id, publication_year, author_id, institution_id (one row per institution of each
+          author, with a null institution_id for the authors without institution)
+        * **concepts** - work_id, publication_year, concept_id, score
+
+        The ids are interned in int64 (see intern_openalex_ids()), the type tag of each id column is stored in the
+        metadata of its field ("openalex_type"). Only the edge tables whose nested column is in the dataset are
+        extracted.
+
+        :param entities_table: The dataset.
+        :type entities_table: pa.Table
+        :return: The edge tables with their name as key.
+        :rtype: dict[str, pa.Table]
+        """
+        edge_tables = {}
+        if 'id' not in entities_table.column_names or 'publication_year' not in entities_table.column_names:
+            return edge_tables
+        works_ids = intern_openalex_ids(entities_table['id'])
+        publication_years = entities_table['publication_year'].combine_chunks()
+
+        def is_list_of_structs(column: str) -> bool:
+            # e.g. a column without any value in the dataset has the null type
+            return column in entities_table.column_names and \
+                pa.types.is_list(entities_table.schema.field(column).type) and \
+                pa.types.is_struct(entities_table.schema.field(column).type.value_type)
+
+        def flatten(list_array: pa.Array) -> tuple[pa.Array, pa.Array]:
+            # the values of the lists, and the index of the list (e.g. of the work) of each value
+            list_array = list_array.combine_chunks() if isinstance(list_array, pa.ChunkedArray) else list_array
+            return pc.list_flatten(list_array), pc.list_parent_indices(list_array)
+
+        if 'referenced_works' in entities_table.column_names and \
+                pa.types.is_list(entities_table.schema.field('referenced_works').type):
+            references, works_index = flatten(entities_table['referenced_works'])
+            edge_tables['references'] = pa.table({'work_id': works_ids.take(works_index),
+                                                  'publication_year': publication_years.take(works_index),
+                                                  'referenced_work_id': intern_openalex_ids(references)})
+        if is_list_of_structs('concepts'):
+            concepts, works_index = flatten(entities_table['concepts'])
+            edge_tables['concepts'] = pa.table({'work_id': works_ids.take(works_index),
+                                                'publication_year': publication_years.take(works_index),
+                                                'concept_id': intern_openalex_ids(pc.struct_field(concepts, 'id')),
+                                                'score': pc.struct_field(concepts, 'score').cast(pa.float64())})
+        if is_list_of_structs('authorships'):
+            authorships, works_index = flatten(entities_table['authorships'])
+            authors_ids = intern_openalex_ids(pc.struct_field(authorships, ['author', 'id']))
+            institutions, authorships_index = flatten(pc.struct_field(authorships, 'institutions'))
+            # the authors without institution are kept with a null institution
+            without_institution = pc.equal(pc.fill_null(pc.list_value_length(
+                pc.struct_field(authorships, 'institutions')), 0), 0)
+            works_index_without_institution = pc.filter(works_index, without_institution)
+            edge_tables['authorships'] = pa.concat_tables([
+                pa.table({'work_id': works_ids.take(works_index.take(authorships_index)),
+                          'publication_year': publication_years.take(works_index.take(authorships_index)),
+                          'author_id': authors_ids.take(authorships_index),
+                          'institution_id': intern_openalex_ids(pc.struct_field(institutions, 'id'))}),
+                pa.table({'work_id': works_ids.take(works_index_without_institution),
+                          'publication_year': publication_years.take(works_index_without_institution),
+                          'author_id': pc.filter(authors_ids, without_institution),
+                          'institution_id': pa.nulls(len(works_index_without_institution), pa.int64())}),
+            ])
+        # store the type tag of the ids
+        types_tags = {'work_id': 'W', 'referenced_work_id': 'W', 'concept_id': 'C', 'author_id': 'A',
+                      'institution_id': 'I'}
+        return {name: edge_table.cast(pa.schema([
+                    field.with_metadata({'openalex_type': types_tags[field.name]})
+                    if field.name in types_tags else field for field in edge_table.schema]))
+                for name, edge_table in edge_tables.items()}
 
     def add_authorships_citation_style(self):
         """
@@ -703,7 +3039,10 @@ class WorksData(EntitiesData, Works):
                                     ordered: bool = True,
                                     return_dataframe: bool = True) -> pd.DataFrame | list:
         """
-        Get multiple works from their DOI by querying them to the OpenAlex API 60 by 60.
+        Get multiple works from their DOI. The works already present in the cached datasets of works are found with
+        the DOI index (see update_works_doi_index()) and read from the parquet files. The other works are queried to
+        the OpenAlex API in batches of DOIs fitting in the maximum URL length, with config.n_parallel_downloads
+        threads.
 
         :param dois: the list of DOIs to query
         :type dois: list[str]
@@ -712,43 +3051,198 @@ class WorksData(EntitiesData, Works):
         :param return_dataframe: Return a Dataframe. If True, the DataFrame returned will also be stored in
             self.entities_df and the cache system will be used. If False, a list will be returned. Default is True.
         :type return_dataframe: bool
-        :return: the list of works as pyalex objects (dictionaries) or DataFrame.
+        :return: the list of works as pyalex objects (dictionaries) or DataFrame. The works found in the cache are
+            returned in the same format as the works from the API.
         :rtype: pd.DataFrame | list
         """
-        res = [] * len(dois)
-        i = 0
-        with tqdm(total=len(dois), disable=config.disable_tqdm_loading_bar) as pbar:
-            # querying more than 60 DOIs causes the HTTP query size being larger than what OpenAlex allows
-            while i + 60 < len(dois):
-                res[i:i+60] = Works().filter(doi='|'.join(dois[i:i+60])).get(per_page=60)
-                i += 60
-                pbar.update(60)
-            res[i:] = Works().filter(doi='|'.join(dois[i:])).get(per_page=60)
-            pbar.update(len(dois) % 60)
+        local_works = get_works_from_doi_index(dois)
+        log_oa.info(f"{len(local_works)} works out of {len(dois)} found in the cached datasets")
+        dois_to_query = [doi for doi in dois if normalise_doi(doi) not in local_works]
+
+        # querying too many DOIs causes the HTTP query size being larger than what OpenAlex allows, so we make
+        # batches of DOIs (at most 100) which fit in the URL
+        batches = []
+        batch_length = 0
+        for doi in dois_to_query:
+            if not batches or len(batches[-1]) == 100 or batch_length + len(quote_plus(doi)) > 3000:
+                batches.append([])
+                batch_length = 0
+            batches[-1].append(doi)
+            batch_length += len(quote_plus(doi)) + 3
+
+        def get_batch(batch_dois: list[str]) -> list:
+            return Works().filter(doi='|'.join(batch_dois)).get(per_page=200)
+
+        res = []
+        with tqdm(total=len(dois_to_query), disable=config.disable_tqdm_loading_bar) as pbar:
+            with ThreadPoolExecutor(max_workers=config.n_parallel_downloads) as executor:
+                for batch, batch_res in zip(batches, executor.map(get_batch, batches)):
+                    res.extend(batch_res)
+                    pbar.update(len(batch))
+
+        if return_dataframe:
+            # similar to the download function, apply the needed formatting (e.g. extracting the abstract)
+            for entity in res:
+                self.filter_and_format_entity_data_from_api_response(entity)
+        res += list(local_works.values())
 
         if ordered:
             # sort the res list with the order provided in the list dois
             # create a dictionary with each doi as key and the index in the res list as value
             # we use lower as the doi can be valid with either lower or upper cases
-            res_dois_index = {entity['doi'].lower(): i for i, entity in enumerate(res) if entity is not None}
+            res_dois_index = {entity['doi'].lower(): i for i, entity in enumerate(res)
+                              if entity is not None and entity['doi'] is not None}
             # sort based on the index
-            res = [res[res_dois_index[entity_doi.lower()]] if res_dois_index.get(entity_doi.lower()) is not None
+            res = [res[res_dois_index[normalise_doi(entity_doi)]]
+                   if res_dois_index.get(normalise_doi(entity_doi)) is not None
                    else None for entity_doi in dois]
 
         if return_dataframe:
-            # similar to the download function, apply the needed formatting (e.g. extracting the abstract)
-            for i in range(len(res)):
-                if res[i] is not None:
-                    self.filter_and_format_entity_data_from_api_response(res[i])
             res = self.convert_entities_list_to_df(res)
         return res
 
 
+def normalise_doi(doi: str) -> str:
+    """
+    Normalises a DOI to the format used by OpenAlex (lower case URL starting with https://doi.org/).
+
+    :param doi: The DOI.
+    :type doi: str
+    :return: The normalised DOI.
+    :rtype: str
+    """
+    doi = doi.strip().lower()
+    if not doi.startswith("https://doi.org/"):
+        doi = "https://doi.org/" + doi.removeprefix("http://doi.org/").removeprefix("doi.org/")
+    return doi
+
+
+works_doi_index_lock = threading.Lock()
+
+
+def connect_works_doi_index() -> sqlite3.Connection:
+    """
+    Connects to the SQLite database of the DOI index of the cached works (and create it if needed).
+
+    :return: The connection to the database.
+    :rtype: sqlite3.Connection
+    """
+    os.makedirs(config.project_data_folder_path, exist_ok=True)
+    connection = sqlite3.connect(join(config.project_data_folder_path, "works_doi_index.sqlite"), timeout=30)
+    connection.execute("CREATE TABLE IF NOT EXISTS dois (doi TEXT PRIMARY KEY, work_id TEXT, file TEXT)")
+    connection.execute("CREATE INDEX IF NOT EXISTS dois_file ON dois (file)")
+    connection.execute("CREATE TABLE IF NOT EXISTS indexed_files (file TEXT PRIMARY KEY, mtime REAL)")
+    return connection
+
+
+def has_works_in_api_format(file_path: str) -> bool:
+    """
+    Checks if the works of a cached dataset can be returned in the format of the API: the dataset has all the columns
+    (see config.download_only_loaded_columns) and it stores the abstracts as inverted indexes (the datasets cached by
+    the previous versions store them as strings, without the abstract_inverted_index column).
+
+    :param file_path: The path of the dataset.
+    :type file_path: str
+    :return: True if the works of the dataset are in the format of the API.
+    :rtype: bool
+    """
+    return (get_dataset_columns(file_path) is None
+            and 'abstract_inverted_index' in get_dataset_schema(file_path).names)
+
+
+def update_works_doi_index(connection: sqlite3.Connection):
+    """
+    Updates the DOI index of the cached works incrementally: only the parquet files of works which were added or
+    modified since the last update are read (only their id and doi columns), and the files removed from the cache
+    (or older than config.cache_max_age) are removed from the index. The cached files are listed from the cache
+    manifest. The datasets whose works aren't in the format of the API (see has_works_in_api_format()) aren't
+    indexed, their works are queried to the API.
+
+    :param connection: The connection to the DOI index database.
+    :type connection: sqlite3.Connection
+    """
+    min_mtime = time() - config.cache_max_age * 86400
+    files = {file: mtime for file, mtime in get_cached_files("works").items() if mtime > min_mtime}
+    indexed_files = dict(connection.execute("SELECT file, mtime FROM indexed_files").fetchall())
+    with connection:
+        for file, mtime in indexed_files.items():
+            if files.get(file) != mtime:
+                connection.execute("DELETE FROM dois WHERE file = ?", (file,))
+                connection.execute("DELETE FROM indexed_files WHERE file = ?", (file,))
+        for file, mtime in files.items():
+            if indexed_files.get(file) != mtime:
+                log_oa.info(f"Adding the DOIs of {file} to the DOI index")
+                try:
+                    file_path = join(config.project_data_folder_path, file)
+                    if not has_works_in_api_format(file_path):
+                        table = None
+                    else:
+                        table = read_dataset_table(file_path, columns=['id', 'doi'])
+                except (OSError, KeyError, pa.ArrowInvalid):
+                    # e.g. empty dataset without columns
+                    table = None
+                if table is not None:
+                    connection.executemany("INSERT OR REPLACE INTO dois VALUES (?, ?, ?)",
+                                           [(doi.lower(), work_id, file) for work_id, doi in
+                                            zip(table['id'].to_pylist(), table['doi'].to_pylist()) if doi is not None])
+                connection.execute("INSERT OR REPLACE INTO indexed_files VALUES (?, ?)", (file, mtime))
+
+
+def get_works_from_doi_index(dois: list[str]) -> dict[str, Work]:
+    """
+    Gets the works which are in the cached datasets of works from their DOI, using the DOI index.
+
+    :param dois: The DOIs.
+    :type dois: list[str]
+    :return: The works found (PyAlex objects, in the same format as the works from the API) with their normalised DOI
+        (see normalise_doi()) as key.
+    :rtype: dict[str, Work]
+    """
+    if not isdir(config.project_data_folder_path) or not dois:
+        return {}
+    dois = list(dict.fromkeys(normalise_doi(doi) for doi in dois))
+    works_per_file = {}
+    with works_doi_index_lock:
+        connection = connect_works_doi_index()
+        update_works_doi_index(connection)
+        # SQLite limits the number of variables in a query
+        for i in range(0, len(dois), 500):
+            batch = dois[i:i+500]
+            for work_id, file in connection.execute(
+                    f"SELECT work_id, file FROM dois WHERE doi IN ({','.join('?' * len(batch))})", batch).fetchall():
+                works_per_file.setdefault(file, []).append(work_id)
+        connection.close()
+    res = {}
+    for file, works_ids in works_per_file.items():
+        try:
+            file_path = join(config.project_data_folder_path, file)
+            if not has_works_in_api_format(file_path):
+                # the file was rewritten with only some columns in the meantime, the works will be queried to the API
+                continue
+            table = read_dataset_table(file_path, filters=[('id', 'in', works_ids)])
+        except (OSError, pa.ArrowInvalid):
+            # the file was removed from the cache in the meantime, the works will be queried to the API
+            continue
+        for work in table.to_pylist():
+            # the abstracts are stored as compact inverted indexes, the API returns them as {word: positions}
+            if work.get('abstract_inverted_index') is not None:
+                work['abstract_inverted_index'] = {word['word']: word['positions']
+                                                   for word in work['abstract_inverted_index']}
+            res[work['doi'].lower()] = Work(work)
+    return res
+
+
 class AuthorsData(EntitiesData, Authors):
     """
     This class contains specific methods for Authors entity data. Not used for now.
     """
     EntityOpenAlex = Authors
+    entities_schema = pa.schema(entities_common_fields + [
+        ('orcid', pa.string()), ('display_name_alternatives', pa.list_(pa.string())),
+        ('affiliations', pa.list_(pa.struct([('institution', dehydrated_institution_type),
+                                             ('years', pa.list_(pa.int64()))]))),
+        ('last_known_institutions', pa.list_(dehydrated_institution_type)), ('topics', pa.list_(topic_type)),
+        ('x_concepts', pa.list_(dehydrated_concept_type)), ('works_api_url', pa.string())])
 
 
 class SourcesData(EntitiesData, Sources):
@@ -756,6 +3250,12 @@ class SourcesData(EntitiesData, Sources):
     This class contains specific methods for Sources entity data. Not used for now.
     """
     EntityOpenAlex = Sources
+    entities_schema = pa.schema(entities_common_fields + [
+        ('issn_l', pa.string()), ('issn', pa.list_(pa.string())), ('host_organization', pa.string()),
+        ('host_organization_name', pa.string()), ('host_organization_lineage', pa.list_(pa.string())),
+        ('is_oa', pa.bool_()), ('is_in_doaj', pa.bool_()), ('homepage_url', pa.string()), ('type', pa.string()),
+        ('country_code', pa.string()), ('topics', pa.list_(topic_type)),
+        ('x_concepts', pa.list_(dehydrated_concept_type)), ('works_api_url', pa.string())])
 
 
 class InstitutionsData(EntitiesData, Institutions):
@@ -763,6 +3263,18 @@ class InstitutionsData(EntitiesData, Institutions):
     This class contains specific methods for Institutions entity data. Not used for now.
     """
     EntityOpenAlex = Institutions
+    entities_schema = pa.schema(entities_common_fields + [
+        ('ror', pa.string()), ('country_code', pa.string()), ('type', pa.string()), ('homepage_url', pa.string()),
+        ('image_url', pa.string()), ('image_thumbnail_url', pa.string()),
+        ('display_name_acronyms', pa.list_(pa.string())), ('display_name_alternatives', pa.list_(pa.string())),
+        ('lineage', pa.list_(pa.string())),
+        ('geo', pa.struct([('city', pa.string()), ('region', pa.string()), ('country_code', pa.string()),
+                           ('country', pa.string()), ('latitude', pa.float64()), ('longitude', pa.float64())])),
+        ('associated_institutions', pa.list_(pa.struct([
+            ('id', pa.string()), ('ror', pa.string()), ('display_name', pa.string()), ('country_code', pa.string()),
+            ('type', pa.string()), ('relationship', pa.string())]))),
+        ('topics', pa.list_(topic_type)), ('x_concepts', pa.list_(dehydrated_concept_type)),
+        ('works_api_url', pa.string())])
 
 
 class ConceptsData(EntitiesData, Concepts):
@@ -770,6 +3282,10 @@ class ConceptsData(EntitiesData, Concepts):
     This class contains specific methods for Concepts entity data. Not used for now.
     """
     EntityOpenAlex = Concepts
+    entities_schema = pa.schema(entities_common_fields + [
+        ('wikidata', pa.string()), ('level', pa.int64()), ('description', pa.string()), ('image_url', pa.string()),
+        ('image_thumbnail_url', pa.string()), ('ancestors', pa.list_(dehydrated_concept_type)),
+        ('related_concepts', pa.list_(dehydrated_concept_type)), ('works_api_url', pa.string())])
 
 
 class TopicsData(EntitiesData, Topics):
@@ -777,6 +3293,10 @@ class TopicsData(EntitiesData, Topics):
     This class contains specific methods for Topics entity data. Not used for now.
     """
     EntityOpenAlex = Topics
+    entities_schema = pa.schema(entities_common_fields + [
+        ('description', pa.string()), ('keywords', pa.list_(pa.string())), ('subfield', dehydrated_entity_type),
+        ('field', dehydrated_entity_type), ('domain', dehydrated_entity_type),
+        ('siblings', pa.list_(dehydrated_entity_type)), ('works_api_url', pa.string())])
 
 
 class PublishersData(EntitiesData, Publishers):
@@ -784,3 +3304,7 @@ class PublishersData(EntitiesData, Publishers):
     This class contains specific methods for Publishers entity data. Not used for now.
     """
     EntityOpenAlex = Publishers
+    entities_schema = pa.schema(entities_common_fields + [
+        ('alternate_titles', pa.list_(pa.string())), ('hierarchy_level', pa.int64()),
+        ('lineage', pa.list_(pa.string())), ('country_codes', pa.list_(pa.string())), ('homepage_url', pa.string()),
+        ('image_url', pa.string()), ('sources_api_url', pa.string())])
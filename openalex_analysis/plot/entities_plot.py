@@ -35,11 +35,11 @@ class EntitiesPlot:
         """
         if plot_parameters is None:
             plot_parameters = {
-                'plot_title': "Plot of the entities related to " + Concepts()[concept]['display_name'] + " studies",
+                'plot_title': "Plot of the entities related to " + get_name_of_entity(concept) + " studies",
                 'x_datas': 'works_count',
                 'x_legend': "Number of works",
                 'y_datas': concept,
-                'y_legend': "Concept score (" + Concepts()[concept]['display_name'] + ")",
+                'y_legend': "Concept score (" + get_name_of_entity(concept) + ")",
             }
         plot_title = plot_parameters['plot_title']
         x_datas = plot_parameters['x_datas']
@@ -119,7 +119,8 @@ class EntitiesPlot:
         if y_datas is None:
             y_datas = self.count_entities_cols
 
-        df = df[y_datas].loc[element].reset_index()
+        # only the rows of the element are converted to dense columns
+        df = self.get_dense_element_count_array(elements=[element])[y_datas].loc[element].reset_index()
 
         df = pd.melt(df, id_vars=x_datas, value_vars=df.columns[1:], var_name='entitie', value_name='nb_used')
 
@@ -257,7 +258,7 @@ class WorksPlot(EntitiesPlot, WorksAnalysis):
             "Institution: %{customdata[2]}",
             "Publication year: %{customdata[3]}",
             "Cited by count: %{customdata[4]}",
-            "Concept score (" + Concepts()[concept]['display_name'] + "): %{customdata[5]}",
+            "Concept score (" + get_name_of_entity(concept) + "): %{customdata[5]}",
         ]
         return hover_template
 
@@ -399,7 +400,7 @@ class InstitutionsPlot(EntitiesPlot, InstitutionsAnalysis):
             "%{customdata[0]}",
             "Country name: %{customdata[1]}",
             #y_legend+": %{y}",
-            "Concept score (" + Concepts()[concept]['display_name'] + "): %{customdata[4]}",
+            "Concept score (" + get_name_of_entity(concept) + "): %{customdata[4]}",
             "Cited by count: %{customdata[2]}",
             "Cited by average: %{customdata[3]}"
         ]
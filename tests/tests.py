@@ -1,9 +1,16 @@
 import sys
-from os.path import isdir
+import json
+import os
+from os.path import isdir, isfile, join
 import shutil
+from time import monotonic
 import pytest
+import requests
 
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyalex import Works, Work
 
 sys.path.append("..")
 
@@ -15,6 +22,16 @@ from openalex_analysis.plot import WorksPlot
 # set the default configuration (this avoids using the configuration defined in the file
 # ~/openalex-analysis/openalex-analysis-conf.toml)
 from openalex_analysis.data.entities_data import set_default_config
+from openalex_analysis.data.entities_data import intern_openalex_ids, get_openalex_ids_from_interned
+from openalex_analysis.data.entities_data import convert_inverted_indexes_to_arrow_array
+from openalex_analysis.data.entities_data import get_abstracts_from_inverted_indexes
+from openalex_analysis.data.entities_data import check_if_entity_exists, check_if_entities_exist
+from openalex_analysis.data.entities_data import RateLimitedSession, api_rate_limiter, get_http_session
+from openalex_analysis.data.entities_data import get_missing_entities_from_cache
+from openalex_analysis.data.entities_data import remove_dataset, read_dataset_table, write_parquet_dataset
+from openalex_analysis.data.entities_data import get_dataset_metadata, get_last_sync_date
+from openalex_analysis.data.entities_data import add_file_to_cache_manifest, touch_file_in_cache_manifest
+from openalex_analysis.data.entities_data import get_cached_files, get_works_from_doi_index
 
 test_configuration_file = "test-openalex-analysis-conf.toml"
 
@@ -182,6 +199,20 @@ def test_get_multiple_works_from_doi():
     # TODO: add a test with more than 60 works
 
 
+def test_get_multiple_works_from_doi_cached():
+    cached_dois = WorksAnalysis(institution_src_id).entities_df['doi'].dropna().to_list()[:2]
+    # a work which isn't in the cached datasets
+    dois = [cached_dois[0], "https://doi.org/10.1038/nature14539", cached_dois[1].upper()]
+    res = WorksData().get_multiple_works_from_doi(dois, return_dataframe=False)
+    assert [work['doi'].lower() for work in res] == [doi.lower() for doi in dois]
+    # the works from the cache have the same format as the works from the API
+    assert all(isinstance(work, Work) for work in res)
+    api_work = Works().filter(doi=cached_dois[0]).get()[0]
+    assert res[0]['abstract'] == api_work['abstract']
+    assert isinstance(res[0]['abstract_inverted_index'], type(api_work['abstract_inverted_index']))
+    assert WorksData().get_multiple_works_from_doi(dois)['id'].to_list() == [work['id'] for work in res]
+
+
 def test_concept_yearly_count():
     concept_sustainability_id = 'C66204764'
     # create the filter for the API to get only the articles about sustainability
@@ -208,9 +239,564 @@ def test_concept_yearly_count():
                                                                        width=900, height=350)
 
 
+def test_element_count_per_year():
+    works = WorksAnalysis(create_dataframe=False)
+    works.entities_df = pd.DataFrame({
+        'id': ["https://openalex.org/W1", "https://openalex.org/W2", "https://openalex.org/W3"],
+        'publication_year': [2020, 2021, 2021],
+        'referenced_works': [["https://openalex.org/W10", "https://openalex.org/W11"], [],
+                             ["https://openalex.org/W10"]],
+        'concepts': [[{'id': "https://openalex.org/C5", 'score': 0.5}], None, [{'id': "https://openalex.org/C5"}]]})
+    count = works.get_element_count('reference')
+    assert count.to_dict() == {"https://openalex.org/W10": 2, "https://openalex.org/W11": 1}
+    count = works.get_element_count('reference', count_years=[2020, 2021, 2022])
+    assert count.to_dict() == {("https://openalex.org/W10", 2020): 1, ("https://openalex.org/W10", 2021): 1,
+                               ("https://openalex.org/W10", 2022): 0, ("https://openalex.org/W11", 2020): 1,
+                               ("https://openalex.org/W11", 2021): 0, ("https://openalex.org/W11", 2022): 0}
+    count = works.get_element_count('concept', count_years=[2021])
+    assert count.to_dict() == {("https://openalex.org/C5", 2021): 1}
+
+
+def test_yearly_usage_index():
+    works = WorksAnalysis(create_dataframe=False)
+    works.entities_df = pd.DataFrame({
+        'id': ["https://openalex.org/W1", "https://openalex.org/W2", "https://openalex.org/W3"],
+        'publication_year': [2020, 2021, 2021],
+        'referenced_works': [["https://openalex.org/W10"], [], ["https://openalex.org/W10"]],
+        'concepts': [[{'id': "https://openalex.org/C5"}], [{'id': "https://openalex.org/C5"}], []]})
+    df = works.get_df_yearly_usage_of_entities([2020, 2021, 2022], ["C5", "W10", "W11"])
+    assert df['usage_count'].to_list() == [1, 1, 0, 1, 1, 0, 0, 0, 0]
+    assert df['works_count'].to_list() == [1, 2, 0] * 3
+    assert works.count_yearly_entity_usage("C5", [2021]) == [1]
+    # the index is built once per dataframe
+    assert set(works.yearly_usage_indexes) == {'concept', 'reference'}
+
+
+def test_yearly_usage_index_of_subset():
+    file_path = join(config.project_data_folder_path, "works_yearly_usage.parquet")
+    os.makedirs(config.project_data_folder_path, exist_ok=True)
+    write_parquet_dataset(pa.table({
+        'id': ["https://openalex.org/W1", "https://openalex.org/W2"],
+        'publication_year': [2020, 2020],
+        'referenced_works': [["https://openalex.org/W10"], ["https://openalex.org/W10"]]}), file_path)
+    try:
+        works = WorksAnalysis(create_dataframe=False)
+        works.database_file_path = file_path
+        works.load_entities_dataframe()
+        df = works.get_df_yearly_usage_of_entities([2020], "W10")
+        assert df['usage_count'].to_list() == [2]
+        # the index persisted with the whole dataset isn't used for a subset of its entities
+        works.entities_df = works.entities_df.iloc[:1]
+        df = works.get_df_yearly_usage_of_entities([2020], "W10")
+        assert df['usage_count'].to_list() == [1]
+        assert df['works_count'].to_list() == [1]
+    finally:
+        remove_dataset(file_path)
+
+
+def test_authors_count():
+    works = WorksAnalysis(create_dataframe=False)
+    works.entities_df = pd.DataFrame({
+        'id': ["https://openalex.org/W1", "https://openalex.org/W2"],
+        'authorships': [
+            [{'author': {'id': "A1", 'display_name': "Author 1", 'orcid': None}, 'raw_affiliation_string': "SRC"},
+             {'author': {'id': "A2", 'display_name': "Author 2", 'orcid': None}, 'raw_affiliation_string': "SU"}],
+            [{'author': {'id': "A2", 'display_name': "Author 2 bis", 'orcid': None}, 'raw_affiliation_string': "SU"},
+             {'author': {'id': None, 'display_name': None, 'orcid': None}, 'raw_affiliation_string': None}]]})
+    df = works.get_authors_count(None)
+    assert df.columns.to_list() == ['author.id', 'count', 'raw_affiliation_string', 'author.display_name',
+                                    'author.orcid']
+    assert df['author.id'].to_list() == ["A2", "A1"]
+    assert df['count'].to_list() == [2, 1]
+    # the metadata come from the first authorship of each author
+    assert df['author.display_name'].to_list() == ["Author 2", "Author 1"]
+
+
+def test_sparse_count_array():
+    works = WorksAnalysis(create_dataframe=False)
+    count_1 = pd.Series([3, 1], index=pd.Index(["W1", "W2"]), dtype='Int64')
+    count_2 = pd.Series([2], index=pd.Index(["W3"]), dtype='Int64')
+    works.element_count_df = works.get_sparse_count_array([("E1", count_1), ("E2", None), ("E3", count_2)])
+    assert all(isinstance(dtype, pd.SparseDtype) for dtype in works.element_count_df.dtypes)
+    assert works.element_count_df.index.to_list() == ["W1", "W2", "W3"]
+    assert works.element_count_df['E3'].to_list() == [0, 0, 2]
+    works.count_element_type = 'reference'
+    works.count_element_years = None
+    works.add_statistics_to_element_count_array(sort_by='sum_all_entities')
+    top = works.get_dense_element_count_array(n_elements=2)
+    assert top.index.to_list() == ["W1", "W3"]
+    assert top['E1'].dtype == np.int64
+
+
 def test_generating_collaboration_map():
     wplt = WorksPlot("I138595864")
 
     wplt.get_collaborations_with_institutions()
 
     wplt.get_figure_collaborations_with_institutions()
+
+
+def test_parallel_download():
+    extra_filters = {
+        'publication_year': "2018-2022",
+        'authorships': {'institutions': {'id': institution_src_id}},
+    }
+    n_max_entities = config.n_max_entities
+    config.n_max_entities = None
+    try:
+        wa_sequential = WorksAnalysis(extra_filters=extra_filters)
+        config.n_parallel_downloads = 4
+        wa_parallel = WorksAnalysis(extra_filters=extra_filters, create_dataframe=False)
+        wa_parallel.database_file_path += ".parallel.parquet"
+        wa_parallel.load_entities_dataframe()
+    finally:
+        config.n_max_entities = n_max_entities
+        config.n_parallel_downloads = 1
+
+    assert set(wa_parallel.entities_df['id']) == set(wa_sequential.entities_df['id'])
+
+
+def test_parallel_counts():
+    entities_from = [{'entity_from_id': "I138595864"}, {'entity_from_id': "I140494188"}]
+    wa_sequential = WorksAnalysis()
+    wa_sequential.create_element_used_count_array('concept', entities_from, count_years=[2020, 2021])
+    config.n_parallel_counts = 2
+    try:
+        wa_parallel = WorksAnalysis()
+        wa_parallel.create_element_used_count_array('concept', entities_from, count_years=[2020, 2021])
+    finally:
+        config.n_parallel_counts = 1
+
+    assert wa_parallel.create_element_count_array_progress_percentage == 100
+    assert wa_parallel.element_count_df.equals(wa_sequential.element_count_df)
+
+
+def test_streaming_download():
+    config.streaming_download = True
+    config.streaming_buffer_size = 50
+    try:
+        # same API query as the works of the institution, but saved in another dataset
+        wa_streaming = WorksAnalysis(extra_filters={'institutions': {'id': institution_src_id}})
+    finally:
+        config.streaming_download = False
+        config.streaming_buffer_size = 10000
+    wa = WorksAnalysis(institution_src_id)
+
+    assert wa_streaming.entities_df['id'].to_list() == wa.entities_df['id'].to_list()
+    assert not isdir(wa_streaming.database_file_path + ".part")
+
+
+def test_resume_streaming_download(monkeypatch):
+    extra_filters = {'publication_year': 2021}
+    write_parquet_segment = WorksAnalysis.write_parquet_segment
+
+    def write_first_parquet_segment(self, entities_list, segments_folder_path, shard_index, segment_index):
+        # interrupt the download after the first segment
+        if segment_index > 0:
+            raise ConnectionError("Download interrupted")
+        write_parquet_segment(self, entities_list, segments_folder_path, shard_index, segment_index)
+
+    config.streaming_download = True
+    config.streaming_buffer_size = 50
+    try:
+        monkeypatch.setattr(WorksAnalysis, "write_parquet_segment", write_first_parquet_segment)
+        wa_interrupted = WorksAnalysis(institution_src_id, extra_filters=extra_filters, create_dataframe=False)
+        # download pages of 50 entities to write several segments
+        wa_interrupted.per_page = 50
+        with pytest.raises(ConnectionError):
+            wa_interrupted.load_entities_dataframe()
+        monkeypatch.undo()
+        # the partial download is resumed even if the streaming mode is disabled
+        config.streaming_download = False
+        wa_resumed = WorksAnalysis(institution_src_id, extra_filters=extra_filters, create_dataframe=False)
+        with open(wa_resumed.database_file_path + ".part/checkpoint.json") as f:
+            assert json.load(f)['shards'][0]['n_downloaded'] == 50
+        wa_resumed.load_entities_dataframe()
+        assert not isdir(wa_resumed.database_file_path + ".part")
+    finally:
+        config.streaming_download = False
+        config.streaming_buffer_size = 10000
+    # download the dataset again without interruption
+    remove_dataset(wa_resumed.database_file_path)
+    wa = WorksAnalysis(institution_src_id, extra_filters=extra_filters)
+
+    assert wa_resumed.entities_df['id'].to_list() == wa.entities_df['id'].to_list()
+
+
+def test_partial_download_of_another_query():
+    wa = WorksAnalysis(create_dataframe=False)
+    wa.database_file_path = join(config.project_data_folder_path, "works_partial_download_test.parquet")
+    os.makedirs(wa.database_file_path + ".part", exist_ok=True)
+    with open(join(wa.database_file_path + ".part", "checkpoint.json"), "w") as f:
+        json.dump({'query': json.dumps({'publication_year': 2000}), 'columns': None, 'shards': []}, f)
+    # the partial download can't be resumed, it is removed
+    assert wa.get_partial_download_checkpoint() is None
+    assert not isdir(wa.database_file_path + ".part")
+
+
+def test_refresh_entities_dataset(monkeypatch):
+    wa = WorksAnalysis(create_dataframe=False)
+    wa.database_file_path = join(config.project_data_folder_path, "works_refresh_test.parquet")
+    os.makedirs(config.project_data_folder_path, exist_ok=True)
+    works_table = pa.table({'id': ["https://openalex.org/W1", "https://openalex.org/W2"], 'cited_by_count': [1, 2]})
+    write_parquet_dataset(works_table, wa.database_file_path, {'last_sync_date': "2020-01-01", 'api_order': 'true'})
+    queries = []
+
+    def download_updated_entities(query, n_max, update_progress=None, *args, columns=None):
+        queries.append(query)
+        return [{'id': "https://openalex.org/W2", 'cited_by_count': 5},
+                {'id': "https://openalex.org/W3", 'cited_by_count': 3}]
+
+    monkeypatch.setattr(wa, "download_entities_of_query", download_updated_entities)
+    assert wa.refresh_entities_dataset()
+
+    assert queries[0]['from_updated_date'] == "2020-01-01"
+    works_df = read_dataset_table(wa.database_file_path).to_pandas()
+    # the updated entities replace the old ones, the other entities are kept
+    assert works_df.set_index('id')['cited_by_count'].to_dict() == {
+        "https://openalex.org/W1": 1, "https://openalex.org/W2": 5, "https://openalex.org/W3": 3}
+    assert get_last_sync_date(wa.database_file_path) > "2020-01-01"
+    assert get_dataset_metadata(wa.database_file_path)['api_order'] == 'false'
+
+
+def test_cache_eviction():
+    project_data_folder_path = config.project_data_folder_path
+    config.project_data_folder_path = join(project_data_folder_path, "eviction")
+    config.max_storage_files = 2
+    config.min_storage_files = 0
+    try:
+        os.makedirs(config.project_data_folder_path, exist_ok=True)
+        files_paths = [join(config.project_data_folder_path, f"works_{i}.parquet") for i in range(3)]
+        for file_path in files_paths:
+            write_parquet_dataset(pa.table({'id': ["https://openalex.org/W1"]}), file_path)
+            add_file_to_cache_manifest(file_path, "works", None, 1)
+        # the files which aren't cached datasets are not counted
+        with open(join(config.project_data_folder_path, "notes.txt"), "w") as f:
+            f.write("not a dataset")
+        touch_file_in_cache_manifest(files_paths[0])
+        WorksAnalysis(create_dataframe=False).auto_remove_databases_saved()
+        # the least recently used dataset is removed
+        assert [isfile(file_path) for file_path in files_paths] == [True, False, True]
+        assert set(get_cached_files("works")) == {"works_0.parquet", "works_2.parquet"}
+        assert isfile(join(config.project_data_folder_path, "notes.txt"))
+    finally:
+        config.project_data_folder_path = project_data_folder_path
+        config.max_storage_files = 10000
+        config.min_storage_files = 1000
+
+
+def test_entities_metadata_cache():
+    from openalex_analysis.data.entities_data import entities_metadata_memory_cache, get_entities_from_metadata_cache
+    from openalex_analysis.analysis import get_name_of_entity, prefetch_entities_metadata
+
+    prefetch_entities_metadata([institution_src_id, "I140494188"])
+    assert "I140494188" in entities_metadata_memory_cache
+    # the metadata are also cached on disk
+    entities_metadata_memory_cache.clear()
+    assert get_entities_from_metadata_cache([institution_src_id])[institution_src_id]['display_name'] == \
+           "Stockholm Resilience Centre"
+    assert get_name_of_entity(institution_src_id) == "Stockholm Resilience Centre"
+
+
+def test_check_if_entity_exists():
+    assert check_if_entity_exists(institution_src_id)
+    assert check_if_entity_exists("https://openalex.org/" + institution_src_id)
+    assert not check_if_entity_exists("I0")
+    # the requests are rate limited with a shared token bucket
+    config.max_requests_per_second = 2
+    try:
+        results = [check_if_entity_exists(institution_src_id) for i in range(4)]
+    finally:
+        config.max_requests_per_second = 10
+    assert all(results)
+
+
+class MockAdapter(requests.adapters.BaseAdapter):
+    """
+    Transport adapter answering the requests with the given HTTP status codes (and JSON contents), and recording when
+    and to which URL they are sent.
+    """
+    def __init__(self, status_codes: list[int], retry_after: str | None = None, contents: list | None = None):
+        super().__init__()
+        self.status_codes = status_codes
+        self.retry_after = retry_after
+        self.contents = contents
+        self.requests_times = []
+        self.requests_urls = []
+
+    def send(self, request, **kwargs):
+        self.requests_times.append(monotonic())
+        self.requests_urls.append(request.url)
+        response = requests.Response()
+        response.status_code = self.status_codes.pop(0)
+        if self.contents is not None:
+            response._content = json.dumps(self.contents.pop(0)).encode()
+            response.headers['Content-Type'] = "application/json"
+        if response.status_code == 429 and self.retry_after is not None:
+            response.headers['Retry-After'] = self.retry_after
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def test_rate_limited_session():
+    session = RateLimitedSession()
+    adapter = MockAdapter([429, 200], retry_after="0.5")
+    session.mount("https://", adapter)
+    # a new maximum rate resets the rate of the limiter
+    config.max_requests_per_second = 20
+    try:
+        response = session.get("https://api.openalex.org/works")
+        # the request is retried after the Retry-After delay
+        assert response.status_code == 200
+        assert adapter.requests_times[1] - adapter.requests_times[0] >= 0.5
+        # the rate is halved after the 429 response, then increases back with the successful requests
+        assert api_rate_limiter.rate == 20 / 2 + 20 / 20
+        # the response is returned once the retries are exhausted
+        adapter = MockAdapter([429] * (config.http_retry_times + 1), retry_after="0")
+        session.mount("https://", adapter)
+        assert session.get("https://api.openalex.org/works").status_code == 429
+        assert len(adapter.requests_times) == config.http_retry_times + 1
+    finally:
+        config.max_requests_per_second = 10
+
+
+def test_check_if_entities_exist():
+    ids = [institution_src_id, "I0", "https://openalex.org/W2741809807", "W0"]
+    assert check_if_entities_exist(ids) == {institution_src_id: True, "I0": False, "W2741809807": True, "W0": False}
+    # the missing ids are in the negative cache
+    assert check_if_entities_exist(["I0", "W0"]) == {"I0": False, "W0": False}
+
+
+def test_check_if_entities_exist_redirected():
+    project_data_folder_path = config.project_data_folder_path
+    config.project_data_folder_path = join(project_data_folder_path, "entities_exist")
+    session = get_http_session()
+    https_adapter = session.get_adapter("https://")
+    # W1 is found by the batch query, W2 was merged into W20 (returned instead of it) and W3 doesn't exist
+    batch_content = {'meta': {'count': 2, 'page': 1, 'per_page': 100},
+                     'results': [{'id': "https://openalex.org/W1"}, {'id': "https://openalex.org/W20"}]}
+    adapter = MockAdapter([200, 200, 404], contents=[batch_content, {'id': "https://openalex.org/W20"}, {}])
+    session.mount("https://", adapter)
+    try:
+        res = check_if_entities_exist(["w1", "https://openalex.org/W2", "W3"])
+        missing_entities = get_missing_entities_from_cache(["W1", "W2", "W3"])
+    finally:
+        session.mount("https://", https_adapter)
+        config.project_data_folder_path = project_data_folder_path
+    assert res == {"w1": True, "W2": True, "W3": False}
+    # the ids not found in the batch are queried one by one
+    assert [url.rsplit("/", 1)[-1] for url in adapter.requests_urls[1:]] == ["W2", "W3"]
+    assert missing_entities == {"W3"}
+
+
+def test_get_multiple_entities_from_id_parallel():
+    # test with more than 100 works queried in parallel
+    entities_ids = WorksAnalysis(institution_src_id).entities_df['id'].str[21:].to_list()[:150]
+    config.n_parallel_downloads = 4
+    try:
+        res = WorksAnalysis().get_multiple_entities_from_id(entities_ids, return_dataframe=False)
+    finally:
+        config.n_parallel_downloads = 1
+    assert [entity['id'][21:] for entity in res] == entities_ids
+
+
+def test_superset_cache_file():
+    n_max_entities = config.n_max_entities
+    config.n_max_entities = 60
+    try:
+        wa_large = WorksAnalysis(institution_src_id)
+        config.n_max_entities = 20
+        wa_small = WorksAnalysis(institution_src_id)
+    finally:
+        config.n_max_entities = n_max_entities
+
+    # the entities are loaded from the file downloaded with n_max_entities = 60
+    assert wa_small.database_file_path == wa_large.database_file_path
+    assert wa_small.entities_df['id'].to_list() == wa_large.entities_df['id'].to_list()[:20]
+
+
+def test_download_datasets_of_entities_from():
+    entities_from = [institution_src_id, "I4210090411"]
+    extra_filters = {'publication_year': 2021}
+    WorksAnalysis(create_dataframe=False).download_datasets_of_entities_from(entities_from, extra_filters=extra_filters)
+    for entity_from_id in entities_from:
+        wa_bulk = WorksAnalysis(entity_from_id, extra_filters=extra_filters, create_dataframe=False)
+        assert isfile(wa_bulk.database_file_path)
+        wa_bulk.load_entities_dataframe()
+        assert len(wa_bulk.entities_df.index) == wa_bulk.get_count_entities_matched(wa_bulk.get_api_query())
+
+
+def test_aggregation_mode():
+    count_years = [2020, 2021]
+    extra_filters = {'publication_year': "2020-2021"}
+    # the aggregation counts aren't limited by n_max_entities, so they are compared with a complete dataset
+    n_max_entities = config.n_max_entities
+    config.n_max_entities = None
+    try:
+        df = WorksAnalysis(institution_src_id, extra_filters=extra_filters).get_df_yearly_usage_of_entities(
+            count_years, "C41008148")
+        df_aggregation = WorksAnalysis(institution_src_id, extra_filters=extra_filters, aggregation_mode=True
+                                       ).get_df_yearly_usage_of_entities(count_years, "C41008148")
+    finally:
+        config.n_max_entities = n_max_entities
+    assert list(df_aggregation.columns) == list(df.columns)
+    assert df_aggregation['years'].to_list() == count_years
+    assert df_aggregation['usage_count'].to_list() == df['usage_count'].to_list()
+    assert df_aggregation['works_count'].to_list() == df['works_count'].to_list()
+
+
+def test_partitioned_dataset():
+    config.partition_datasets = True
+    try:
+        wa_partitioned = WorksAnalysis(institution_src_id, create_dataframe=False)
+        wa_partitioned.database_file_path += ".partitioned.parquet"
+        wa_partitioned.load_entities_dataframe()
+        wa_partitioned_2020 = WorksAnalysis(institution_src_id, create_dataframe=False)
+        wa_partitioned_2020.database_file_path = wa_partitioned.database_file_path
+        wa_partitioned_2020.load_entities_dataframe(filters=[('publication_year', '=', 2020)])
+    finally:
+        config.partition_datasets = False
+    wa = WorksAnalysis(institution_src_id)
+
+    assert isdir(wa_partitioned.database_file_path)
+    assert sorted(wa_partitioned.entities_df['id']) == sorted(wa.entities_df['id'])
+    assert wa_partitioned.entities_df.columns.to_list() == wa.entities_df.columns.to_list()
+    assert sorted(wa_partitioned_2020.entities_df['id']) == \
+           sorted(wa.entities_df[wa.entities_df['publication_year'] == 2020]['id'])
+
+
+def test_arrow_cache_format():
+    config.cache_format = 'arrow'
+    try:
+        wa_arrow = WorksAnalysis(institution_src_id)
+    finally:
+        config.cache_format = 'parquet'
+    wa = WorksAnalysis(institution_src_id)
+
+    assert wa_arrow.database_file_path.endswith(".arrow")
+    assert isinstance(wa_arrow.entities_df['id'].dtype, pd.ArrowDtype)
+    assert wa_arrow.entities_df['id'].to_list() == wa.entities_df['id'].to_list()
+    assert wa_arrow.get_element_count('concept').sort_index().to_list() == \
+           wa.get_element_count('concept').sort_index().to_list()
+
+
+def test_arrow_cache_format_analysis():
+    config.cache_format = 'arrow'
+    try:
+        wa_arrow = WorksAnalysis(institution_src_id)
+        wa_arrow.add_authorships_citation_style()
+        authors_count_arrow = wa_arrow.get_authors_count(['author.id', 'count', 'author.display_name'])
+        collaborations_arrow = InstitutionsAnalysis().get_collaborations_with_institutions([institution_src_id])
+    finally:
+        config.cache_format = 'parquet'
+    wa = WorksAnalysis(institution_src_id)
+    wa.add_authorships_citation_style()
+    collaborations = InstitutionsAnalysis().get_collaborations_with_institutions([institution_src_id])
+
+    assert isinstance(wa_arrow.entities_df['authorships'].dtype, pd.ArrowDtype)
+    assert wa_arrow.entities_df['author_citation_style'].to_list() == wa.entities_df['author_citation_style'].to_list()
+    assert authors_count_arrow.equals(wa.get_authors_count(['author.id', 'count', 'author.display_name']))
+    assert collaborations_arrow.sort_values('id').reset_index(drop=True).equals(
+        collaborations.sort_values('id').reset_index(drop=True))
+
+
+def test_download_only_loaded_columns():
+    config.download_only_loaded_columns = True
+    try:
+        wa_references = WorksAnalysis(institution_src_id, create_dataframe=False,
+                                      load_only_columns=['id', 'referenced_works', 'publication_year'])
+        wa_references.database_file_path += ".columns.parquet"
+        wa_references.load_entities_dataframe()
+        # the missing columns are added to the dataset
+        wa_concepts = WorksAnalysis(institution_src_id, create_dataframe=False, load_only_columns=['id', 'concepts'])
+        wa_concepts.database_file_path = wa_references.database_file_path
+        wa_concepts.load_entities_dataframe()
+    finally:
+        config.download_only_loaded_columns = False
+    wa = WorksAnalysis(institution_src_id)
+
+    assert wa_references.entities_df.columns.to_list() == ['id', 'referenced_works', 'publication_year']
+    assert wa_concepts.entities_df['id'].to_list() == wa_references.entities_df['id'].to_list()
+    assert wa_concepts.entities_df.set_index('id')['concepts'].apply(len).to_dict() == \
+           wa.entities_df.set_index('id')['concepts'].apply(len).to_dict()
+
+
+def test_works_doi_index():
+    project_data_folder_path = config.project_data_folder_path
+    config.project_data_folder_path = join(project_data_folder_path, "doi_index")
+    try:
+        os.makedirs(config.project_data_folder_path, exist_ok=True)
+        abstract = {'abstract_inverted_index': convert_inverted_indexes_to_arrow_array(
+            [{'Deep': [0], 'learning': [1]}])}
+        for file, work_id, columns, dataset_metadata in [
+                ("works_all_columns.parquet", "W1", abstract, None),
+                ("works_some_columns.parquet", "W2", {}, {'columns': '["id", "doi"]'}),
+                # dataset cached by a previous version, with the abstracts as strings
+                ("works_previous_format.parquet", "W3", {'abstract': ["Deep learning"]}, None)]:
+            file_path = join(config.project_data_folder_path, file)
+            write_parquet_dataset(pa.table({'id': ["https://openalex.org/" + work_id],
+                                            'doi': ["https://doi.org/10.1/" + work_id]} | columns), file_path,
+                                  dataset_metadata)
+            add_file_to_cache_manifest(file_path, "works", None, 1)
+        works = get_works_from_doi_index(["10.1/W1", "https://doi.org/10.1/w2", "10.1/W3"])
+    finally:
+        config.project_data_folder_path = project_data_folder_path
+
+    # the works of a dataset with only some columns or in the previous format aren't in the format of the API, they
+    # aren't used
+    assert list(works) == ["https://doi.org/10.1/w1"]
+    assert works["https://doi.org/10.1/w1"]['id'] == "https://openalex.org/W1"
+    assert works["https://doi.org/10.1/w1"]['abstract'] == "Deep learning"
+
+
+def test_convert_entities_list_to_table():
+    works = [{'id': "https://openalex.org/W1", 'publication_year': 2020, 'concepts': [{'id': "C1", 'score': 1}],
+              'new_field': {'value': 1}},
+             None,
+             {'id': "https://openalex.org/W2", 'publication_year': None, 'referenced_works': None}]
+    table = WorksData(create_dataframe=False).convert_entities_list_to_table(works)
+    assert table.num_rows == 3
+    # the types come from the schema, even without any value
+    assert table.schema.field('referenced_works').type == pa.list_(pa.string())
+    assert table.schema.field('concepts').type.value_type.field('score').type == pa.float64()
+    # the fields unknown in the schema are kept
+    assert table['new_field'].to_pylist() == [{'value': 1}, None, None]
+
+
+def test_abstracts_from_inverted_indexes():
+    inverted_indexes = [{"world": [1, 3], "hello": [0], "again": [2]}, None, {}]
+    abstracts = get_abstracts_from_inverted_indexes(convert_inverted_indexes_to_arrow_array(inverted_indexes))
+    assert abstracts.to_pylist() == ["hello world again world", None, ""]
+
+
+def test_intern_openalex_ids():
+    ids = pa.array(["https://openalex.org/W2741809807", "W123", None])
+    interned_ids = intern_openalex_ids(ids)
+    assert interned_ids.to_pylist() == [2741809807, 123, None]
+    assert get_openalex_ids_from_interned(interned_ids, 'W').to_pylist() == \
+           ["https://openalex.org/W2741809807", "https://openalex.org/W123", None]
+    assert intern_openalex_ids(pa.array([["W1", "W2"], None, []])).to_pylist() == [[1, 2], None, []]
+
+
+def test_edge_tables():
+    config.write_edge_tables = True
+    try:
+        wa_edges = WorksAnalysis(institution_src_id, create_dataframe=False)
+        wa_edges.database_file_path += ".edges.parquet"
+        wa_edges.load_entities_dataframe()
+    finally:
+        config.write_edge_tables = False
+    wa = WorksAnalysis(institution_src_id)
+
+    assert wa_edges.get_edge_table('references') is not None
+    assert wa_edges.get_edge_table('references')['referenced_work_id'].dtype == 'int64'
+    # the institutions ids have missing values (authors without institution), they are dropped in Arrow
+    assert wa_edges.get_edge_table('authorships', ['work_id', 'institution_id'], dropna=True)['institution_id'].dtype \
+           == 'int64'
+    assert wa_edges.get_element_count('reference').to_dict() == wa.get_element_count('reference').to_dict()
+    assert wa_edges.get_element_count('concept', count_years=[2020]).to_dict() == \
+           wa.get_element_count('concept', count_years=[2020]).to_dict()